@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, Request
 from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -8,17 +8,27 @@ from flask_bootstrap import Bootstrap
 from flask_wtf import CSRFProtect
 from werkzeug.security import generate_password_hash
 
+from app.database import database_uri, engine_options, configure_sqlite, env_flag
+
 load_dotenv()
 db = SQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
+# Module level so token-authenticated API views can be exempted from CSRF checks
+csrf = CSRFProtect()
 socketio = None
 
 
+class AppRequest(Request):
+    # Transfers post two fields per line, so large pick lists exceed Werkzeug's default of 1000 parts
+    max_form_parts = int(os.getenv('MAX_FORM_PARTS', 20000))
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models import User
-    return User.query.get(int(user_id))
+    # Served from a short-lived cache; admin changes to a user invalidate its entry
+    from app.principals import user_cache
+    return user_cache.load(int(user_id))
 
 
 def create_admin_user():
@@ -37,12 +47,55 @@ def create_admin_user():
         print("Admin user created.")
 
 
+def init_db():
+    """Create or upgrade the schema and bootstrap the admin user; returns the migrations applied."""
+    from app.migrations import upgrade
+    from app.versioning import ensure_versions
+
+    applied = upgrade()
+    ensure_versions()
+    create_admin_user()
+    return applied
+
+
 def create_app(args: list):
     global socketio
     app = Flask(__name__)
+    app.request_class = AppRequest
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///inventory.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLITE_WAL'] = env_flag('SQLITE_WAL', True)
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['INSTRUMENTATION'] = env_flag('INSTRUMENTATION', False)
+    app.config['SLOW_QUERY_THRESHOLD'] = float(os.getenv('SLOW_QUERY_THRESHOLD', 0.25))
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE')
+    app.config['SOCKETIO_COALESCE_WINDOW'] = float(os.getenv('SOCKETIO_COALESCE_WINDOW', 0.5))
     app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['TRANSFERS_PER_PAGE'] = int(os.getenv('TRANSFERS_PER_PAGE', 50))
+    app.config['ITEM_SEARCH_LIMIT'] = int(os.getenv('ITEM_SEARCH_LIMIT', 20))
+    app.config['ITEM_IMPORT_CHUNK_SIZE'] = int(os.getenv('ITEM_IMPORT_CHUNK_SIZE', 1000))
+    app.config['REPORT_CACHE_PATH'] = os.getenv('REPORT_CACHE_PATH')
+    app.config['REPORT_CACHE_MAX_ENTRIES'] = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 200))
+    app.config['REPORT_CACHE_TTL'] = int(os.getenv('REPORT_CACHE_TTL', 3600))
+    app.config['REPORT_WORKERS'] = int(os.getenv('REPORT_WORKERS', 0))
+    app.config['REPORT_PARTITIONS'] = int(os.getenv('REPORT_PARTITIONS', 0))
+    app.config['REPORT_PARALLEL_MIN_DAYS'] = int(os.getenv('REPORT_PARALLEL_MIN_DAYS', 90))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['USER_CACHE_MAX_ENTRIES'] = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))
+    app.config['USER_CACHE_VERSION_CHECK'] = float(os.getenv('USER_CACHE_VERSION_CHECK', 2))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 30))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+    app.config['JOB_FOLDER'] = os.getenv('JOB_FOLDER')
+    app.config['JOB_RETENTION'] = int(os.getenv('JOB_RETENTION', 86400))
+    app.config['JOB_HEARTBEAT'] = int(os.getenv('JOB_HEARTBEAT', 10))
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+    app.config['API_MAX_BATCH_SIZE'] = int(os.getenv('API_MAX_BATCH_SIZE', 5000))
+    # Production workers skip this and rely on "flask init-db" having run once before they start
+    app.config['INIT_DB_ON_STARTUP'] = env_flag('INIT_DB_ON_STARTUP', True)
     if '--demo' in args:
         app.config['DEMO'] = True
     else:
@@ -51,11 +104,19 @@ def create_app(args: list):
     db.init_app(app)
     login_manager.init_app(app)
     Bootstrap(app)
-    socketio = SocketIO(app)
+    # Without a message queue events only reach clients connected to this process
+    socketio = SocketIO(app, message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],
+                        async_mode=app.config['SOCKETIO_ASYNC_MODE'])
 
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite(db.engine, app.config['SQLITE_WAL'], app.config['SQLITE_BUSY_TIMEOUT'])
+
+        from app.instrumentation import metrics
+        metrics.init_app(app, db.engine)
+
         from app.routes import auth_routes
-        from app.routes.routes import main, location, item, transfer
+        from app.routes.routes import main, location, item, transfer, job
         from app.routes.auth_routes import auth, admin
         from app.models import User
 
@@ -64,10 +125,30 @@ def create_app(args: list):
         app.register_blueprint(location)
         app.register_blueprint(item)
         app.register_blueprint(transfer)
+        app.register_blueprint(job)
         app.register_blueprint(admin)
 
-        db.create_all()
-        create_admin_user()
-        CSRFProtect(app)
+        from app.commands import register_commands
+        register_commands(app)
+
+        from app.notifications import notifier
+        from app.sockets import register_socket_handlers
+        notifier.init_app(app, socketio)
+        register_socket_handlers(socketio)
+
+        from app.http_cache import response_cache
+        from app.jobs import job_runner
+        from app.parallel_reports import parallel_reports
+        from app.principals import user_cache
+        from app.report_cache import report_cache
+        job_runner.init_app(app, socketio)
+        response_cache.init_app(app)
+        parallel_reports.init_app(app)
+        user_cache.init_app(app)
+        report_cache.init_app(app)
+
+        if app.config['INIT_DB_ON_STARTUP']:
+            init_db()
+        csrf.init_app(app)
 
     return app, socketio
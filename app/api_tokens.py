@@ -0,0 +1,54 @@
+import hashlib
+import secrets
+from datetime import datetime
+from functools import wraps
+
+from flask import abort, g, request
+from sqlalchemy import select, update
+
+from app import db
+from app.models import ApiToken, User
+
+
+def hash_token(secret):
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def create_token(user_id, name):
+    """Create a token for ``user_id``; returns it with its secret, which is only shown this once."""
+    secret = secrets.token_urlsafe(32)
+    api_token = ApiToken(name=name, user_id=user_id, token_hash=hash_token(secret))
+    db.session.add(api_token)
+    db.session.commit()
+    return api_token, secret
+
+
+def revoke_token(token_id):
+    revoked = db.session.execute(update(ApiToken).where(ApiToken.id == token_id, ApiToken.revoked_at.is_(None))
+                                 .values(revoked_at=datetime.utcnow())).rowcount
+    db.session.commit()
+    return bool(revoked)
+
+
+def token_required(view):
+    """Authenticate the view with an ``Authorization: Bearer`` token instead of the session.
+
+    Such views carry no session cookie to forge, so they are the only ones exempt from CSRF.
+    The id of the token's user is available as ``g.api_user_id``.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, secret = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not secret.strip():
+            abort(401)
+        user_id = db.session.scalar(
+            select(User.id).join(ApiToken, ApiToken.user_id == User.id)
+            .where(ApiToken.token_hash == hash_token(secret.strip()), ApiToken.revoked_at.is_(None),
+                   User.active == True))
+        if user_id is None:
+            abort(401)
+        g.api_user_id = user_id
+        return view(*args, **kwargs)
+
+    return wrapper
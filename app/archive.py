@@ -0,0 +1,69 @@
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import ArchivedTransfer, ArchivedTransferItem, Transfer, TransferItem
+
+# The hot and archived transfer tables with their lines; both tiers share column names
+TIERS = ((Transfer, TransferItem), (ArchivedTransfer, ArchivedTransferItem))
+TRANSFER_COLUMNS = ('id', 'from_location_id', 'to_location_id', 'user_id', 'date_created', 'completed')
+LINE_COLUMNS = ('transfer_id', 'item_id', 'quantity')
+
+
+def archive_horizon(execute=None):
+    """Return the date of the newest archived transfer, or None while the archive is empty.
+
+    Every archived transfer is dated at or before the horizon, so reads of later ranges
+    never need the archive tables.
+    """
+    execute = execute or db.session.execute
+    return execute(select(func.max(ArchivedTransfer.date_created))).scalar()
+
+
+def reaches_archive(start, horizon):
+    """Whether a range starting at ``start`` (None for unbounded) can include archived transfers."""
+    return horizon is not None and (start is None or start <= horizon)
+
+
+def archive_transfers(before, batch_size=1000, progress=None):
+    """Move completed transfers dated before ``before``, with their lines, to the archive tables.
+
+    Each batch is copied and deleted in its own transaction so writers are only held up
+    briefly. Stock balances and rollups already count these transfers and are left alone.
+    Returns the number of transfers archived.
+    """
+    archived = 0
+    while True:
+        batch = db.session.scalars(
+            select(Transfer.id).where(Transfer.completed == True, Transfer.date_created < before)
+            .order_by(Transfer.date_created, Transfer.id).limit(batch_size).with_for_update()).all()
+        if not batch:
+            break
+
+        # Completion is checked again under the write lock; transfers uncompleted meanwhile stay hot
+        moved = db.session.scalars(
+            insert(ArchivedTransfer).from_select(
+                TRANSFER_COLUMNS, select(*[getattr(Transfer, name) for name in TRANSFER_COLUMNS])
+                .where(Transfer.id.in_(batch), Transfer.completed == True))
+            .returning(ArchivedTransfer.id)).all()
+        if moved:
+            db.session.execute(insert(ArchivedTransferItem).from_select(
+                LINE_COLUMNS, select(*[getattr(TransferItem, name) for name in LINE_COLUMNS])
+                .where(TransferItem.transfer_id.in_(moved)).order_by(TransferItem.id)))
+            db.session.execute(delete(TransferItem).where(TransferItem.transfer_id.in_(moved))
+                               .execution_options(synchronize_session=False))
+            db.session.execute(delete(Transfer).where(Transfer.id.in_(moved))
+                               .execution_options(synchronize_session=False))
+        db.session.commit()
+
+        archived += len(moved)
+        if progress is not None:
+            progress(archived)
+        if len(batch) < batch_size:
+            break
+    return archived
+
+
+def id_collisions():
+    """Return the ids held by both a hot and an archived transfer; views and archiving break on these."""
+    return db.session.scalars(select(Transfer.id).join(ArchivedTransfer, ArchivedTransfer.id == Transfer.id)
+                              .order_by(Transfer.id)).all()
@@ -0,0 +1,36 @@
+import threading
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Item, Location
+from app.versioning import current_versions
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _cached(table, version, load):
+    # Every commit that writes the table bumps its version, in any worker process,
+    # so a stale list is never served past the next version check
+    entry = _cache.get(table)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    choices = load()
+    with _lock:
+        _cache[table] = (version, choices)
+    return choices
+
+
+def _load_locations():
+    return [tuple(row) for row in db.session.execute(select(Location.id, Location.name).order_by(Location.id))]
+
+
+def _load_items():
+    return [tuple(row) for row in db.session.execute(select(Item.id, Item.name).order_by(Item.id))]
+
+
+def transfer_choices():
+    """Return the ``(id, name)`` choices for locations and items, checking both versions in one query."""
+    location_version, item_version = current_versions('location', 'item')
+    return _cached('location', location_version, _load_locations), _cached('item', item_version, _load_items)
@@ -0,0 +1,168 @@
+import click
+
+
+def register_commands(app):
+    @app.cli.command('rebuild-stock')
+    def rebuild_stock_command():
+        """Recompute location stock balances from the transfer history."""
+        from app.ledger import rebuild_stock
+
+        balances = rebuild_stock()
+        click.echo(f'Rebuilt {balances} stock balances.')
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the hourly and daily transfer rollups from the transfer history."""
+        from app.rollups import rebuild_rollups
+
+        buckets = rebuild_rollups()
+        click.echo(f'Rebuilt {buckets} rollup buckets.')
+
+    @app.cli.command('check-rollups')
+    def check_rollups_command():
+        """Compare the transfer rollups with a recomputation from the raw transfers."""
+        from app.rollups import check_rollups
+
+        mismatches = check_rollups()
+        for (granularity, bucket, from_id, to_id, item_id), stored, expected in mismatches:
+            click.echo(f'{granularity} {bucket:%Y-%m-%d %H:%M} from={from_id} to={to_id} item={item_id}: '
+                       f'stored {stored}, expected {expected}')
+        if mismatches:
+            raise click.ClickException(f'{len(mismatches)} rollup buckets are inconsistent.')
+        click.echo('Rollups are consistent.')
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Create missing tables and apply pending schema migrations."""
+        from app.migrations import upgrade
+
+        applied = upgrade()
+        for version, description in applied:
+            click.echo(f'Applied migration {version}: {description}')
+        click.echo(f'Database is up to date ({len(applied)} migrations applied).')
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create or upgrade the schema and create the admin user if there is none."""
+        from app import init_db
+
+        applied = init_db()
+        for version, description in applied:
+            click.echo(f'Applied migration {version}: {description}')
+        click.echo(f'Database is initialised ({len(applied)} migrations applied).')
+
+    @app.cli.command('explain-queries')
+    def explain_queries_command():
+        """Check that the hot list and report queries are planned on their indexes."""
+        from app.query_plans import check_query_plans
+
+        failures = 0
+        for name, expected_index, plan, uses_index in check_query_plans():
+            click.echo(f'[{"ok" if uses_index else "MISSING"}] {name}: expects {expected_index}')
+            if not uses_index:
+                failures += 1
+                click.echo('    ' + plan.replace('\n', '\n    '))
+        if failures:
+            raise click.ClickException(f'{failures} queries do not use their expected index.')
+
+    @app.cli.command('seed')
+    @click.option('--locations', default=20, show_default=True, help='Locations to create.')
+    @click.option('--items', default=2000, show_default=True, help='Items to create.')
+    @click.option('--users', default=10, show_default=True, help='Active users to create.')
+    @click.option('--transfers', default=10000, show_default=True, help='Transfers to create.')
+    @click.option('--lines', default=8, show_default=True, help='Mean lines per transfer.')
+    @click.option('--days', default=365, show_default=True, help='Spread transfers over this many past days.')
+    @click.option('--completed', default=0.8, show_default=True, help='Fraction of transfers completed.')
+    @click.option('--password', default='password', show_default=True, help='Password of the generated users.')
+    @click.option('--seed', 'seed_value', type=int, help='Random seed for a reproducible data set.')
+    def seed_command(locations, items, users, transfers, lines, days, completed, password, seed_value):
+        """Fill the configured database with synthetic production-like data."""
+        from app.seed import seed
+
+        counts = seed(locations=locations, items=items, users=users, transfers=transfers,
+                      lines_per_transfer=lines, days=days, completed_ratio=completed, password=password,
+                      seed_value=seed_value, progress=lambda created: click.echo(f'{created} transfers...'))
+        click.echo('Seeded {locations} locations, {items} items, {users} users and {transfers} transfers.'
+                   .format(**counts))
+
+    @app.cli.command('prune-transfer-changes')
+    @click.option('--days', default=7, show_default=True, help='Keep changes logged in the last N days.')
+    def prune_transfer_changes_command(days):
+        """Trim the transfer change log that live transfer lists catch up from."""
+        from datetime import datetime, timedelta
+
+        from app.notifications import prune_changes
+
+        deleted = prune_changes(datetime.utcnow() - timedelta(days=days))
+        click.echo(f'Deleted {deleted} transfer changes.')
+
+    @app.cli.command('archive-transfers')
+    @click.option('--days', type=int, help='Archive completed transfers older than N days [ARCHIVE_AFTER_DAYS].')
+    @click.option('--batch-size', type=int, help='Transfers moved per transaction [ARCHIVE_BATCH_SIZE].')
+    def archive_transfers_command(days, batch_size):
+        """Move old completed transfers out of the tables the transfer list and reports scan."""
+        from datetime import datetime, timedelta
+
+        from app.archive import archive_transfers
+
+        days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+        archived = archive_transfers(datetime.utcnow() - timedelta(days=days),
+                                     batch_size or app.config['ARCHIVE_BATCH_SIZE'],
+                                     progress=lambda moved: click.echo(f'{moved} transfers...'))
+        click.echo(f'Archived {archived} completed transfers older than {days} days.')
+
+    @app.cli.command('check-archive')
+    def check_archive_command():
+        """Check that no transfer id is used in both the hot and the archive tables."""
+        from app.archive import id_collisions
+
+        collisions = id_collisions()
+        for transfer_id in collisions:
+            click.echo(f'Transfer {transfer_id} is both hot and archived.')
+        if collisions:
+            raise click.ClickException(f'{len(collisions)} transfer ids collide with the archive.')
+        click.echo('Transfer ids are unique across the archive.')
+
+    @app.cli.command('snapshot-stock')
+    def snapshot_stock_command():
+        """Snapshot stock balances so point-in-time queries only replay movements since; run periodically."""
+        from app.stock_history import take_snapshot
+
+        snapshot = take_snapshot()
+        if snapshot is None:
+            click.echo('No stock movements since the last snapshot.')
+        else:
+            click.echo(f'Snapshot {snapshot.id} covers movements up to {snapshot.last_movement_id}.')
+
+    @app.cli.command('create-api-token')
+    @click.option('--email', required=True, help='User the token acts as.')
+    @click.option('--name', required=True, help='What the token is for, e.g. the scanner or system using it.')
+    def create_api_token_command(email, name):
+        """Create a bearer token for the JSON API and print it."""
+        from app.api_tokens import create_token
+        from app.models import User
+
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise click.ClickException(f'No user with email {email}.')
+        api_token, secret = create_token(user.id, name)
+        click.echo(f'Token {api_token.id} for {email}; it is not shown again:')
+        click.echo(secret)
+
+    @app.cli.command('revoke-api-token')
+    @click.argument('token_id', type=int)
+    def revoke_api_token_command(token_id):
+        """Revoke an API token by id."""
+        from app.api_tokens import revoke_token
+
+        if not revoke_token(token_id):
+            raise click.ClickException(f'No active API token {token_id}.')
+        click.echo(f'Revoked API token {token_id}.')
+
+    @app.cli.command('serve', context_settings={'ignore_unknown_options': True, 'help_option_names': []})
+    @click.argument('args', nargs=-1, type=click.UNPROCESSED)
+    def serve_command(args):
+        """Run the app under gunicorn; see "serve --help" for the options."""
+        from app.server import main
+
+        raise SystemExit(main(list(args)))
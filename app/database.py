@@ -0,0 +1,52 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+
+
+def env_flag(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_uri():
+    uri = os.getenv('DATABASE_URL', 'sqlite:///inventory.db')
+    # Some hosts still hand out the scheme SQLAlchemy dropped in 1.4
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from the DB_* environment variables."""
+    options = {
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if uri.startswith('sqlite'):
+        # The busy timeout is applied per connection in configure_sqlite
+        return options
+    options.update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    })
+    return options
+
+
+def configure_sqlite(engine, wal, busy_timeout):
+    """Switch every new SQLite connection of ``engine`` to WAL mode with a busy timeout.
+
+    WAL lets readers carry on while a writer holds the lock, and the busy timeout makes
+    concurrent writers from other worker processes wait for it instead of failing.
+    """
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        if wal:
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')
+        cursor.close()
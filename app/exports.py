@@ -0,0 +1,91 @@
+import csv
+import io
+import tempfile
+
+from sqlalchemy import select, union_all
+
+from app import db
+from app.archive import TIERS, archive_horizon, reaches_archive
+from app.models import Item, Location, Transfer, TransferItem
+
+TRANSFER_LINE_HEADER = ['Transfer ID', 'Date Created', 'From Location', 'To Location', 'Item', 'Quantity',
+                        'Completed']
+REPORT_HEADER = ['From Location', 'To Location', 'Item', 'Quantity']
+
+
+def _transfer_line_statement(transfers, lines, filter_option, start, end):
+    from_location = db.aliased(Location)
+    to_location = db.aliased(Location)
+    statement = select(transfers.id.label('id'), transfers.date_created.label('date_created'),
+                       from_location.name.label('from_name'), to_location.name.label('to_name'),
+                       Item.name.label('item_name'), lines.quantity.label('quantity'),
+                       transfers.completed.label('completed')) \
+        .select_from(transfers) \
+        .join(lines, transfers.id == lines.transfer_id) \
+        .join(Item, lines.item_id == Item.id) \
+        .join(from_location, transfers.from_location_id == from_location.id) \
+        .join(to_location, transfers.to_location_id == to_location.id)
+    if filter_option == 'completed':
+        statement = statement.where(transfers.completed == True)
+    elif filter_option == 'not_completed':
+        statement = statement.where(transfers.completed == False)
+    if start is not None:
+        statement = statement.where(transfers.date_created >= start)
+    if end is not None:
+        statement = statement.where(transfers.date_created <= end)
+    return statement
+
+
+def transfer_line_rows(filter_option='all', start=None, end=None, batch_size=1000):
+    """Yield every transfer line matching the filters, fetched ``batch_size`` rows at a time."""
+    statement = _transfer_line_statement(Transfer, TransferItem, filter_option, start, end) \
+        .order_by(Transfer.date_created, Transfer.id)
+    # The archive only holds completed transfers dated up to its horizon
+    if filter_option != 'not_completed' and reaches_archive(start, archive_horizon()):
+        tiers = union_all(*[_transfer_line_statement(transfers, lines, filter_option, start, end)
+                            for transfers, lines in TIERS]).subquery()
+        statement = select(tiers).order_by(tiers.c.date_created, tiers.c.id)
+
+    # yield_per streams from a server-side cursor instead of buffering the whole result
+    for transfer_id, date_created, from_name, to_name, item_name, quantity, completed in \
+            db.session.execute(statement.execution_options(yield_per=batch_size)):
+        yield [transfer_id, date_created.strftime('%Y-%m-%d %H:%M:%S'), from_name, to_name, item_name, quantity,
+               'Yes' if completed else 'No']
+
+
+def report_rows(aggregated_transfers):
+    for row in aggregated_transfers:
+        yield [row['from_location_name'], row['to_location_name'], row['item_name'], row['total_quantity']]
+
+
+def csv_chunks(header, rows, chunk_rows=500):
+    """Encode ``rows`` as CSV, yielding the text every ``chunk_rows`` rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_file(header, rows, title):
+    """Write ``rows`` to a temporary XLSX file and return it rewound, or None without openpyxl."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return None
+
+    # Write-only mode keeps a constant amount of the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
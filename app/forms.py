@@ -9,7 +9,7 @@ from wtforms.fields.numeric import IntegerField
 from wtforms.fields.simple import PasswordField, FileField
 from wtforms.validators import DataRequired, Length, Email
 
-from app.models import Location, Item
+from app.choices import transfer_choices
 
 
 class LoginForm(FlaskForm):
@@ -34,7 +34,8 @@ class ItemForm(FlaskForm):
 
 
 class TransferItemForm(FlaskForm):
-    item = SelectField('Item', coerce=int)
+    # Submitted item ids are checked against the database in one query when the lines are saved
+    item = SelectField('Item', coerce=int, validate_choice=False)
     quantity = IntegerField('Quantity')
 
 
@@ -47,13 +48,22 @@ class TransferForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(TransferForm, self).__init__(*args, **kwargs)
-        # Dynamically set choices for from_location_id and to_location_id
-        self.from_location_id.choices = [(l.id, l.name) for l in Location.query.all()]
-        self.to_location_id.choices = [(l.id, l.name) for l in Location.query.all()]
-        # Here you might need to ensure that item choices are correctly populated
-        # This is just an example and might need adjustment
+        # Choices come from a per-process cache that reloads when locations or items change
+        location_choices, item_choices = transfer_choices()
+        self.from_location_id.choices = location_choices
+        self.to_location_id.choices = location_choices
         for item_form in self.items:
-            item_form.item.choices = [(i.id, i.name) for i in Item.query.all()]
+            item_form.item.choices = item_choices
+
+
+class TransferActionForm(FlaskForm):
+    # Only carries the CSRF token for the per-row actions on the transfer list
+    pass
+
+
+class ResetMetricsForm(FlaskForm):
+    # Only carries the CSRF token for the reset button on the metrics page
+    pass
 
 
 class UserForm(FlaskForm):
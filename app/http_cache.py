@@ -0,0 +1,74 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from app.lru import TTLCache
+from app.versioning import current_versions
+
+
+class ResponseCache:
+    """Conditional GET responses for read-heavy views, keyed by the data versions they render.
+
+    The ETag covers the endpoint, its arguments and the version stamps of the tables the view
+    reads, so a revalidation answers 304 after a single version query until one of those tables
+    changes. The rendered body is also kept for RESPONSE_CACHE_TTL seconds to answer clients
+    that do not send If-None-Match.
+    """
+
+    def __init__(self):
+        self._responses = TTLCache()
+
+    def init_app(self, app):
+        self._responses = TTLCache(app.config['RESPONSE_CACHE_TTL'], app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+
+    @staticmethod
+    def _csrf_epoch():
+        # Pages embed CSRF tokens; renew them well before WTF_CSRF_TIME_LIMIT expires a cached copy
+        time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+        return int(time.time() // (time_limit / 2)) if time_limit else 0
+
+    def etag(self, tables, per_user, view_args):
+        parts = [request.endpoint, sorted(request.args.items(multi=True)), view_args, current_versions(*tables)]
+        if per_user:
+            # The navigation bar and CSRF tokens differ per user and session
+            parts += [current_user.get_id(), session.get('csrf_token'), self._csrf_epoch()]
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()[:32]
+
+    def cached(self, *tables, per_user=True):
+        """Serve the decorated GET view conditionally; ``tables`` are the tables it reads."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pending flash messages are consumed by the render, so those pages are never reused
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                etag = self.etag(tables, per_user, kwargs)
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+                else:
+                    cached = self._responses.get(etag)
+                    if cached is None:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200 or response.direct_passthrough:
+                            return response
+                        self._responses.put(etag, (response.get_data(), response.mimetype))
+                    else:
+                        body, mimetype = cached
+                        response = make_response(body)
+                        response.mimetype = mimetype
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,84 @@
+import csv
+import io
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import insert, select
+
+from app import db
+from app.models import Item
+from app.search import execute_item_statement
+
+MAX_NAME_LENGTH = Item.__table__.c.name.type.length
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def lines_per_second(self):
+        return (self.inserted + self.skipped) / self.seconds if self.seconds else 0.0
+
+
+def read_item_names(stream, filename):
+    """Yield item names from an uploaded file without reading it into memory.
+
+    ``.csv`` files take the ``name`` column when the header has one and the first column
+    otherwise, so catalogue exports with extra columns import as-is. Any other file is
+    read as one name per line.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    if not filename.lower().endswith('.csv'):
+        for line in text:
+            yield line.strip()
+        return
+
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+    if 'name' in columns:
+        position = columns.index('name')
+    else:
+        position = 0
+        yield header[0].strip() if header else ''
+    for row in reader:
+        yield row[position].strip() if len(row) > position else ''
+
+
+def import_item_names(names, chunk_size, progress=None):
+    """Insert every name that is not already an item, committing every ``chunk_size`` new names."""
+    result = ImportResult()
+    started = time.perf_counter()
+    seen = set()
+    batch = []
+
+    def flush():
+        existing = set(db.session.execute(select(Item.name).where(Item.name.in_(batch))).scalars())
+        new_names = [name for name in batch if name not in existing]
+        if new_names:
+            # Staged so each chunk's commit adds its items to the search index instead of reloading it
+            execute_item_statement(insert(Item), 'add', [{'name': name} for name in new_names])
+        db.session.commit()
+        result.inserted += len(new_names)
+        result.skipped += len(existing)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for name in names:
+        if not name or len(name) > MAX_NAME_LENGTH or name in seen:
+            result.skipped += 1
+            continue
+        seen.add(name)
+        batch.append(name)
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+
+from app import db, ledger
+from app.models import Item, Location, Transfer, TransferItem
+
+# Ids or names looked up per IN query, well under SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 5000
+
+
+def _reference(value):
+    # Numbers refer to ids and strings to names; JSON booleans are neither
+    if isinstance(value, int) and not isinstance(value, bool):
+        return 'id', value
+    if isinstance(value, str) and value.strip():
+        return 'name', value.strip()
+    return None
+
+
+def _parse(record):
+    """Check the shape of one record; returns its errors and ``(from, to, lines, completed, date_created)``."""
+    if not isinstance(record, dict):
+        return ['Record must be an object.'], None
+    errors = []
+    from_key = _reference(record.get('from_location'))
+    to_key = _reference(record.get('to_location'))
+    if from_key is None:
+        errors.append('from_location must be a location id or name.')
+    if to_key is None:
+        errors.append('to_location must be a location id or name.')
+
+    lines = []
+    items = record.get('items')
+    if not isinstance(items, list) or not items:
+        errors.append('items must be a non-empty list.')
+        items = []
+    for position, line in enumerate(items):
+        line = line if isinstance(line, dict) else {}
+        key = _reference(line.get('item'))
+        quantity = line.get('quantity')
+        if key is None:
+            errors.append(f'items[{position}].item must be an item id or name.')
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or not quantity:
+            errors.append(f'items[{position}].quantity must be a non-zero integer.')
+        elif key is not None:
+            lines.append((key, quantity))
+
+    completed = record.get('completed', False)
+    if not isinstance(completed, bool):
+        errors.append('completed must be true or false.')
+    date_created = None
+    if record.get('date_created') is not None:
+        try:
+            date_created = datetime.fromisoformat(record['date_created'])
+        except (TypeError, ValueError):
+            errors.append('date_created must be an ISO 8601 date and time.')
+        else:
+            if date_created.tzinfo is not None:
+                date_created = date_created.astimezone(timezone.utc).replace(tzinfo=None)
+    return errors, (from_key, to_key, lines, completed, date_created)
+
+
+def _resolve(model, keys):
+    """Map the ``('id', id)`` and ``('name', name)`` keys that exist in ``model`` to row ids."""
+    ids = sorted({value for kind, value in keys if kind == 'id'})
+    names = sorted({value for kind, value in keys if kind == 'name'})
+    found = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        found.update({('id', row_id): row_id for row_id in db.session.scalars(
+            select(model.id).where(model.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])))})
+    for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+        found.update({('name', name): row_id for name, row_id in db.session.execute(
+            select(model.name, model.id).where(model.name.in_(names[start:start + LOOKUP_CHUNK_SIZE])))})
+    return found
+
+
+def ingest_transfers(records, user_id):
+    """Validate a batch of transfer records and insert the valid ones with a few bulk statements.
+
+    A record is ``{"from_location", "to_location", "items": [{"item", "quantity"}]}`` plus
+    optional ``completed``, ``date_created`` and a client ``ref`` echoed back. Locations and
+    items are referenced by id (a number) or name (a string), and every reference in the
+    batch is resolved with one query per table. Repeated items in a record are summed, as
+    on the transfer form. Completed transfers update stock and rollups.
+
+    Returns one result per record, in order, and the ids of the transfers created. Joins
+    the current transaction; the caller commits.
+    """
+    parsed = [_parse(record) for record in records]
+    fields = [record_fields for _, record_fields in parsed if record_fields is not None]
+    locations = _resolve(Location, [key for from_key, to_key, *_ in fields for key in (from_key, to_key) if key])
+    items = _resolve(Item, [key for _, _, lines, *_ in fields for key, _ in lines])
+
+    results = []
+    accepted = []
+    for index, (record, (errors, record_fields)) in enumerate(zip(records, parsed)):
+        result = {'index': index}
+        if isinstance(record, dict) and record.get('ref') is not None:
+            result['ref'] = record['ref']
+        results.append(result)
+        if record_fields is not None:
+            from_key, to_key, lines, completed, date_created = record_fields
+            for label, key in (('from_location', from_key), ('to_location', to_key)):
+                if key is not None and key not in locations:
+                    errors.append(f'Unknown {label} {key[1]!r}.')
+            quantities = {}
+            for key, quantity in lines:
+                if key not in items:
+                    errors.append(f'Unknown item {key[1]!r}.')
+                else:
+                    quantities[items[key]] = quantities.get(items[key], 0) + quantity
+        if errors:
+            result.update(status='error', errors=errors)
+            continue
+        result['status'] = 'created'
+        accepted.append((result, {
+            'from_location_id': locations[from_key],
+            'to_location_id': locations[to_key],
+            'user_id': user_id,
+            'date_created': date_created or datetime.utcnow(),
+            'completed': completed
+        }, {item_id: quantity for item_id, quantity in quantities.items() if quantity}))
+
+    if not accepted:
+        return results, []
+
+    transfer_ids = list(db.session.scalars(
+        insert(Transfer).returning(Transfer.id, sort_by_parameter_order=True), [row for _, row, _ in accepted]))
+    lines = [(transfer_id, item_id, quantity) for transfer_id, (_, _, quantities) in zip(transfer_ids, accepted)
+             for item_id, quantity in quantities.items()]
+    if lines:
+        db.session.execute(insert(TransferItem), [{'transfer_id': transfer_id, 'item_id': item_id,
+                                                   'quantity': quantity} for transfer_id, item_id, quantity in lines])
+
+    completed = [(transfer_id, row['from_location_id'], row['to_location_id'], row['date_created'])
+                 for transfer_id, (_, row, _) in zip(transfer_ids, accepted) if row['completed']]
+    if completed:
+        ledger.apply_movements(ledger.movements_for_transfers(completed, lines), 1)
+    for transfer_id, (result, _, _) in zip(transfer_ids, accepted):
+        result['id'] = transfer_id
+    return results, transfer_ids
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, as used by the Prometheus export
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        position = next((index for index, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        self.counts[position] += 1
+        self.count += 1
+        self.sum += seconds
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, fraction):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return 0.0
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.sql = Histogram()
+        self.sql_statements = 0
+
+
+class Metrics:
+    """Process-wide request, SQL and template timings collected when INSTRUMENTATION is on."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_threshold = 0.0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = defaultdict(EndpointStats)
+            self.templates = defaultdict(Histogram)
+            self.slow_queries = deque(maxlen=100)
+
+    def init_app(self, app, engine):
+        self.enabled = app.config['INSTRUMENTATION']
+        if not self.enabled:
+            return
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD']
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._finish_template, app)
+        event.listen(engine, 'before_cursor_execute', self._start_statement)
+        event.listen(engine, 'after_cursor_execute', self._finish_statement)
+
+    @staticmethod
+    def _endpoint():
+        return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_statements = 0
+        g.metrics_sql_seconds = 0.0
+
+    def _finish_request(self, exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        with self._lock:
+            stats = self.endpoints[self._endpoint()]
+            stats.latency.observe(time.perf_counter() - started)
+            stats.sql.observe(g.pop('metrics_sql_seconds', 0.0))
+            stats.sql_statements += g.pop('metrics_sql_statements', 0)
+
+    def _start_template(self, sender, template, context, **extra):
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+    def _finish_template(self, sender, template, context, **extra):
+        starts = g.get('metrics_templates')
+        if starts:
+            with self._lock:
+                self.templates[template.name].observe(time.perf_counter() - starts.pop())
+
+    @staticmethod
+    def _start_statement(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('metrics_statements', []).append(time.perf_counter())
+
+    def _finish_statement(self, connection, cursor, statement, parameters, context, executemany):
+        starts = connection.info.get('metrics_statements')
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        if has_request_context() and 'metrics_started' in g:
+            g.metrics_sql_statements += 1
+            g.metrics_sql_seconds += seconds
+        if seconds >= self.slow_query_threshold:
+            endpoint = self._endpoint()
+            logger.warning('Slow query (%.3fs) in %s: %s', seconds, endpoint, statement)
+            with self._lock:
+                self.slow_queries.append((time.time(), endpoint, seconds, statement))
+
+    def prometheus(self):
+        """Render the collected metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name, help_text, label, histograms):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, values in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), values.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {values.sum:.6f}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {values.count}')
+
+        with self._lock:
+            histogram('assetflow_request_duration_seconds', 'Request latency by endpoint.', 'endpoint',
+                      {key: stats.latency for key, stats in self.endpoints.items()})
+            histogram('assetflow_request_sql_duration_seconds', 'Time spent in SQL per request by endpoint.',
+                      'endpoint', {key: stats.sql for key, stats in self.endpoints.items()})
+            lines.append('# HELP assetflow_sql_statements_total SQL statements executed by endpoint.')
+            lines.append('# TYPE assetflow_sql_statements_total counter')
+            for key, stats in sorted(self.endpoints.items()):
+                lines.append(f'assetflow_sql_statements_total{{endpoint="{key}"}} {stats.sql_statements}')
+            histogram('assetflow_template_render_seconds', 'Template render time by template.', 'template',
+                      self.templates)
+            lines.append('# HELP assetflow_slow_queries Slow queries kept in the recent log.')
+            lines.append('# TYPE assetflow_slow_queries gauge')
+            lines.append(f'assetflow_slow_queries {len(self.slow_queries)}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
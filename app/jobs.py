@@ -0,0 +1,305 @@
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Job
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+# Progress is pushed to the browser at most this often per job
+PROGRESS_INTERVAL = 1.0
+
+# A running job whose worker missed this many heartbeats is taken to have died with it
+MISSED_HEARTBEATS = 3
+
+
+def user_room(user_id):
+    return f'user-{user_id}'
+
+
+def job_payload(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class JobRunner:
+    """Runs imports, reports and exports on a thread pool instead of inside the request.
+
+    Jobs are rows of the job table, so their status can be read from any worker process.
+    The table is also the queue: a job only runs once its row is claimed, so a job runs once
+    however many processes try. Once serving requests, each process heartbeats its running
+    jobs every JOB_HEARTBEAT seconds, fails running jobs whose process stopped heartbeating,
+    and takes over jobs left queued by a process that stopped before running them; their
+    uploads are read from JOB_FOLDER, which processes on several hosts must share.
+
+    Progress and completion are pushed to the owner's Socket.IO room. With JOB_WORKERS=0
+    jobs run inline when submitted.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.executor = None
+        self.folder = None
+        self.retention = None
+        self.heartbeat = None
+        self.handlers = {}
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._maintaining = False
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.folder = app.config.get('JOB_FOLDER') or os.path.join(app.instance_path, 'jobs')
+        self.retention = app.config['JOB_RETENTION']
+        self.heartbeat = app.config['JOB_HEARTBEAT']
+        os.makedirs(self.folder, exist_ok=True)
+        workers = app.config['JOB_WORKERS']
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') if workers > 0 else None
+        if self.executor is not None:
+            # Started by the first request, so CLI commands never take over jobs
+            app.before_request(self._start_maintenance)
+
+    @property
+    def worker(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def handler(self, kind):
+        def register(function):
+            self.handlers[kind] = function
+            return function
+        return register
+
+    def path(self, job_id, suffix):
+        return os.path.join(self.folder, job_id + suffix)
+
+    def submit(self, kind, user_id, params, upload=None):
+        """Queue a job and return it; ``upload`` is a file saved for the handler to read."""
+        self.prune()
+        job = Job(id=uuid.uuid4().hex, kind=kind, user_id=user_id, status=QUEUED, params=json.dumps(params))
+        if upload is not None:
+            upload.save(self.path(job.id, '.upload'))
+        db.session.add(job)
+        db.session.commit()
+        if self.executor is None:
+            self._run(job.id)
+            db.session.refresh(job)
+        else:
+            self._enqueue(job.id)
+        return job
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            self._pending.discard(job_id)
+        with self.app.app_context():
+            # Only the process whose update flips the row from queued runs the job
+            now = datetime.utcnow()
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, started_at=now, worker=self.worker, heartbeat_at=now)
+                .execution_options(synchronize_session=False)).rowcount
+            db.session.commit()
+            if not claimed:
+                return
+
+            job = db.session.get(Job, job_id)
+            reporter = _ProgressReporter(self, job)
+            try:
+                result = self.handlers[job.kind](job, json.loads(job.params), reporter)
+            except Exception as error:
+                db.session.rollback()
+                current_app.logger.exception('Job %s (%s) failed', job_id, job.kind)
+                self._finish(job_id, FAILED, message=str(error)[:255])
+            else:
+                self._finish(job_id, DONE, result=result, message=reporter.message, progress=reporter.done)
+            finally:
+                upload = self.path(job_id, '.upload')
+                if os.path.exists(upload):
+                    os.remove(upload)
+
+    def _finish(self, job_id, status, result=None, message=None, progress=None):
+        job = db.session.get(Job, job_id)
+        job.status = status
+        if progress is not None:
+            job.progress = progress
+        job.result = json.dumps(result) if result is not None else None
+        job.message = message
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        self.socketio.emit('job_finished', job_payload(job), to=user_room(job.user_id))
+
+    def _start_maintenance(self):
+        with self._lock:
+            if self._maintaining:
+                return
+            self._maintaining = True
+        self.socketio.start_background_task(self._maintain)
+
+    def _maintain(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    self.recover()
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception('Job recovery failed')
+            self.socketio.sleep(self.heartbeat)
+
+    def recover(self):
+        """Heartbeat this process's running jobs, fail orphaned ones and take over abandoned queued ones."""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.heartbeat * MISSED_HEARTBEATS)
+        db.session.execute(update(Job).where(Job.status == RUNNING, Job.worker == self.worker)
+                           .values(heartbeat_at=now).execution_options(synchronize_session=False))
+        orphaned = db.session.scalars(
+            update(Job).where(Job.status == RUNNING, or_(Job.heartbeat_at < stale, Job.heartbeat_at.is_(None)))
+            .values(status=FAILED, finished_at=now, message='The server stopped while this job was running.')
+            .returning(Job.id).execution_options(synchronize_session=False)).all()
+        abandoned = db.session.scalars(select(Job.id).where(Job.status == QUEUED, Job.created_at < stale)).all()
+        db.session.commit()
+
+        for job_id in orphaned:
+            job = db.session.get(Job, job_id)
+            self.socketio.emit('job_finished', job_payload(job), to=user_room(job.user_id))
+        for job_id in abandoned:
+            self._enqueue(job_id)
+        return orphaned, abandoned
+
+    def prune(self):
+        """Delete jobs that finished longer than JOB_RETENTION seconds ago, with their files."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        expired = db.session.scalars(select(Job).where(Job.finished_at < cutoff)).all()
+        for job in expired:
+            for suffix in ('.upload', '.output'):
+                if os.path.exists(self.path(job.id, suffix)):
+                    os.remove(self.path(job.id, suffix))
+            db.session.delete(job)
+        if expired:
+            db.session.commit()
+
+
+class _ProgressReporter:
+    """Called by handlers as ``progress(done, message)``; stores and pushes it, throttled."""
+
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.done = 0
+        self.message = None
+        self.pushed = 0.0
+
+    def __call__(self, done, message=None):
+        self.done = done
+        self.message = message
+        now = time.monotonic()
+        if now - self.pushed < PROGRESS_INTERVAL:
+            return
+        self.pushed = now
+        # On a connection of its own: committing the session would end the handler's transaction
+        # and close the server-side cursor an export is still streaming from
+        try:
+            with db.engine.begin() as connection:
+                job = connection.execute(update(Job).where(Job.id == self.job_id)
+                                         .values(progress=done, message=message)
+                                         .returning(*Job.__table__.c)).first()
+        except OperationalError:
+            # Progress is only informative; without WAL, SQLite can refuse it while the handler reads
+            current_app.logger.warning('Could not store the progress of job %s', self.job_id)
+            return
+        self.runner.socketio.emit('job_progress', job_payload(job), to=user_room(self.user_id))
+
+
+job_runner = JobRunner()
+
+
+@job_runner.handler('import_items')
+def _import_items(job, params, progress):
+    from app.importer import read_item_names, import_item_names
+
+    def report(partial):
+        progress(partial.inserted + partial.skipped, f'{partial.inserted} added, {partial.skipped} skipped')
+
+    with open(job_runner.path(job.id, '.upload'), 'rb') as upload:
+        result = import_item_names(read_item_names(upload, params['filename']),
+                                   current_app.config['ITEM_IMPORT_CHUNK_SIZE'], progress=report)
+    progress(result.inserted + result.skipped, f'{result.inserted} added, {result.skipped} skipped '
+                                               f'({result.lines_per_second:.0f} lines/s)')
+    return {'inserted': result.inserted, 'skipped': result.skipped, 'lines_per_second': result.lines_per_second}
+
+
+@job_runner.handler('report')
+def _generate_report(job, params, progress):
+    from app.parallel_reports import parallel_reports
+    from app.report_cache import report_cache
+    from app.rollups import named_report
+
+    start = datetime.fromisoformat(params['start'])
+    end = datetime.fromisoformat(params['end'])
+    report_cache.put(params['report_id'], {
+        'start_datetime': start.strftime('%Y-%m-%d %H:%M'),
+        'end_datetime': end.strftime('%Y-%m-%d %H:%M'),
+        'aggregated_transfers': named_report(parallel_reports.report_totals(start, end))
+    })
+    return {'report_id': params['report_id']}
+
+
+@job_runner.handler('export_transfers')
+def _export_transfers(job, params, progress):
+    from app.exports import TRANSFER_LINE_HEADER, csv_chunks, transfer_line_rows, xlsx_file
+
+    start = datetime.fromisoformat(params['start']) if params.get('start') else None
+    end = datetime.fromisoformat(params['end']) if params.get('end') else None
+    counted = [0]
+
+    def rows():
+        for row in transfer_line_rows(params['filter'], start, end):
+            counted[0] += 1
+            if counted[0] % 10000 == 0:
+                progress(counted[0], f'{counted[0]} lines exported')
+            yield row
+
+    output_path = job_runner.path(job.id, '.output')
+    if params['format'] == 'xlsx':
+        output = xlsx_file(TRANSFER_LINE_HEADER, rows(), 'transfers')
+        if output is None:
+            raise RuntimeError('XLSX export requires openpyxl to be installed.')
+        with output, open(output_path, 'wb') as output_file:
+            shutil.copyfileobj(output, output_file)
+    else:
+        with open(output_path, 'w', newline='', encoding='utf-8') as output_file:
+            for chunk in csv_chunks(TRANSFER_LINE_HEADER, rows()):
+                output_file.write(chunk)
+    progress(counted[0], f'{counted[0]} lines exported')
+    return {'filename': f'transfers.{params["format"]}', 'lines': counted[0]}
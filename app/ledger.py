@@ -0,0 +1,145 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import joinedload
+
+from app import db, rollups
+from app.archive import TIERS
+from app.models import LocationStock, StockMovement, TransferItem, TransferRollup
+
+# One transfer line as it affects stock: quantity leaves from_location and arrives at to_location
+Movement = namedtuple('Movement', 'transfer_id from_location_id to_location_id date_created item_id quantity')
+
+
+def movements_for(transfer, lines=None):
+    """Return the movements of ``transfer``, optionally for ``lines`` of ``(item_id, quantity)``."""
+    if lines is None:
+        lines = db.session.execute(select(TransferItem.item_id, TransferItem.quantity)
+                                   .where(TransferItem.transfer_id == transfer.id)).all()
+    return [Movement(transfer.id, transfer.from_location_id, transfer.to_location_id, transfer.date_created,
+                     item_id, quantity) for item_id, quantity in lines]
+
+
+def movements_for_transfers(transfers, lines=None):
+    """Return the movements of several transfers given as ``(id, from, to, date_created)`` rows.
+
+    Their lines are read with one query unless passed as ``(transfer_id, item_id, quantity)`` rows.
+    """
+    transfers = {row[0]: row for row in transfers}
+    if lines is None:
+        lines = db.session.execute(select(TransferItem.transfer_id, TransferItem.item_id, TransferItem.quantity)
+                                   .where(TransferItem.transfer_id.in_(transfers))).all() if transfers else []
+    movements = []
+    for transfer_id, item_id, quantity in lines:
+        if transfer_id in transfers:
+            _, from_location_id, to_location_id, date_created = transfers[transfer_id]
+            movements.append(Movement(transfer_id, from_location_id, to_location_id, date_created, item_id,
+                                      quantity))
+    return movements
+
+
+def apply_transfer(transfer, sign, lines=None):
+    """Add (``sign=1``) or reverse (``sign=-1``) the effect of a completed transfer on stock and rollups."""
+    apply_movements(movements_for(transfer, lines), sign)
+
+
+def apply_transfer_edit(before, transfer, lines):
+    """Swap the movements ``before`` of an edited completed transfer for its new ``lines``.
+
+    Both sides go through one call so lines that did not change cancel out.
+    """
+    reversed_before = [movement._replace(quantity=-movement.quantity) for movement in before]
+    apply_movements(reversed_before + movements_for(transfer, lines), 1)
+
+
+def apply_movements(movements, sign):
+    movements = list(movements)
+    increment(TransferRollup.__table__, ('granularity', 'bucket', 'from_location_id', 'to_location_id', 'item_id'),
+              'quantity', rollups.rollup_rows(movements, sign))
+
+    # Net change per transfer, so lines an edit left alone cancel out of the movement log
+    deltas = defaultdict(int)
+    for movement in movements:
+        deltas[(movement.transfer_id, movement.from_location_id, movement.item_id)] -= sign * movement.quantity
+        deltas[(movement.transfer_id, movement.to_location_id, movement.item_id)] += sign * movement.quantity
+    changes = [{'transfer_id': transfer_id, 'location_id': location_id, 'item_id': item_id, 'quantity': quantity}
+               for (transfer_id, location_id, item_id), quantity in deltas.items() if quantity]
+
+    balances = defaultdict(int)
+    for change in changes:
+        balances[(change['location_id'], change['item_id'])] += change['quantity']
+    increment(LocationStock.__table__, ('location_id', 'item_id'), 'quantity',
+              [{'location_id': location_id, 'item_id': item_id, 'quantity': quantity}
+               for (location_id, item_id), quantity in balances.items() if quantity])
+    record_stock_movements(changes)
+
+
+def record_stock_movements(changes, execute=None):
+    """Append ``changes`` to the stock movement log in the current transaction."""
+    if changes:
+        execute = execute or db.session.execute
+        recorded_at = datetime.utcnow()
+        execute(insert(StockMovement), [dict(change, recorded_at=recorded_at) for change in changes])
+
+
+def increment(table, key_columns, value_column, rows):
+    """Atomically add each row's value onto the row with the same key, inserting it if missing.
+
+    Runs as a single ``INSERT ... ON CONFLICT DO UPDATE`` so concurrent writers never lose
+    an increment. Joins the current transaction; the caller commits.
+    """
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    statement = upsert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={value_column: table.c[value_column] + statement.excluded[value_column]})
+    db.session.execute(statement, rows)
+
+
+def location_stock(location_id):
+    return LocationStock.query.options(joinedload(LocationStock.item)).filter(
+        LocationStock.location_id == location_id,
+        LocationStock.quantity != 0).all()
+
+
+def rebuild_stock(execute=None):
+    """Recompute every stock balance from the completed transfer history, archive included.
+
+    ``execute`` runs the statements on another connection, whose owner then commits.
+    """
+    commit = execute is None
+    execute = execute or db.session.execute
+    balances = defaultdict(int)
+    for transfers, lines in TIERS:
+        for column, sign in ((transfers.to_location_id, 1), (transfers.from_location_id, -1)):
+            totals = execute(
+                select(column, lines.item_id, func.sum(lines.quantity))
+                .join(lines, lines.transfer_id == transfers.id)
+                .where(transfers.completed == True)
+                .group_by(column, lines.item_id))
+            for location_id, item_id, quantity in totals:
+                balances[(location_id, item_id)] += sign * quantity
+
+    # Whatever the rebuild changes is logged as a correction, so the movement log keeps adding up
+    corrections = defaultdict(int, balances)
+    for location_id, item_id, quantity in execute(
+            select(LocationStock.location_id, LocationStock.item_id, LocationStock.quantity)):
+        corrections[(location_id, item_id)] -= quantity
+    record_stock_movements([{'transfer_id': None, 'location_id': location_id, 'item_id': item_id,
+                             'quantity': quantity} for (location_id, item_id), quantity in corrections.items()
+                            if quantity], execute)
+
+    execute(delete(LocationStock))
+    rows = [{'location_id': location_id, 'item_id': item_id, 'quantity': quantity}
+            for (location_id, item_id), quantity in balances.items() if quantity]
+    if rows:
+        execute(insert(LocationStock), rows)
+    if commit:
+        db.session.commit()
+    return len(rows)
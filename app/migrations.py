@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from sqlalchemy import MetaData, func, insert, inspect, literal, select
+from sqlalchemy.schema import CreateTable
+
+from app import db
+from app.ledger import rebuild_stock
+from app.models import (ArchivedTransfer, Job, Location, LocationStock, SchemaMigration, StockMovement,
+                        StockSnapshot, StockSnapshotLine, Transfer, TransferItem, User)
+from app.rollups import rebuild_rollups
+
+
+def _create_indexes(*tables):
+    def migrate(connection):
+        for table in tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return migrate
+
+
+def _add_columns(table, *names):
+    def migrate(connection):
+        existing = {column['name'] for column in inspect(connection).get_columns(table.name)}
+        for name in names:
+            if name not in existing:
+                column_type = table.c[name].type.compile(connection.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}')
+    return migrate
+
+
+def _baseline_stock_snapshot(connection):
+    # Balances from before the movement log existed become the start of the stock history. They
+    # already include the corrections step 2 logged while computing them, so the snapshot covers those.
+    last_movement_id = connection.execute(select(func.max(StockMovement.__table__.c.id))).scalar() or 0
+    snapshot_id = connection.execute(insert(StockSnapshot.__table__)
+                                     .values(taken_at=datetime.utcnow(), last_movement_id=last_movement_id)
+                                     .returning(StockSnapshot.__table__.c.id)).scalar()
+    stock = LocationStock.__table__
+    connection.execute(insert(StockSnapshotLine.__table__).from_select(
+        ['snapshot_id', 'location_id', 'item_id', 'quantity'],
+        select(literal(snapshot_id), stock.c.location_id, stock.c.item_id, stock.c.quantity)
+        .where(stock.c.quantity != 0)))
+
+
+def _autoincrement_transfer_ids(connection):
+    # Without AUTOINCREMENT SQLite reuses ids past the largest one left, including archived ids.
+    # Other databases draw ids from a sequence and never reuse them.
+    if connection.dialect.name != 'sqlite':
+        return
+    table = Transfer.__table__
+    definition = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transfer'").scalar()
+    if 'AUTOINCREMENT' not in definition.upper():
+        # SQLite cannot alter a column, so copy the rows into a rebuilt table
+        metadata = MetaData()
+        for referenced in (Location.__table__, User.__table__):
+            referenced.to_metadata(metadata)
+        connection.execute(CreateTable(table.to_metadata(metadata, name='transfer_rebuild')))
+        columns = ', '.join(column.name for column in table.columns)
+        connection.exec_driver_sql(f'INSERT INTO transfer_rebuild ({columns}) SELECT {columns} FROM transfer')
+        connection.exec_driver_sql('DROP TABLE transfer')
+        connection.exec_driver_sql('ALTER TABLE transfer_rebuild RENAME TO transfer')
+        for index in table.indexes:
+            index.create(connection)
+
+    # Start numbering after every id handed out so far, hot or archived
+    last_id = max(connection.execute(select(func.max(table.c.id))).scalar() or 0,
+                  connection.execute(select(func.max(ArchivedTransfer.__table__.c.id))).scalar() or 0)
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'transfer'")
+    connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('transfer', ?)", (last_id,))
+
+
+# Ordered schema changes for databases created before the change was made. Never edit or
+# renumber a step once released; add a new one instead. db.create_all() already builds new
+# tables with their final definition, so steps only need to cover existing tables.
+MIGRATIONS = [
+    (1, 'Index transfer filters and transfer line joins',
+     _create_indexes(Transfer.__table__, TransferItem.__table__)),
+    (2, 'Compute stock balances from the existing transfers', lambda connection: rebuild_stock(connection.execute)),
+    (3, 'Start the stock history from the current balances', _baseline_stock_snapshot),
+    (4, 'Never reuse transfer ids', _autoincrement_transfer_ids),
+    (5, 'Track which process runs each job', _add_columns(Job.__table__, 'worker', 'heartbeat_at')),
+    (6, 'Build the transfer rollups from the existing transfers',
+     lambda connection: rebuild_rollups(connection.execute)),
+]
+
+
+def pending_migrations():
+    with db.engine.connect() as connection:
+        applied = set(connection.execute(select(SchemaMigration.version)).scalars())
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def upgrade():
+    """Create missing tables, then apply every pending migration in its own transaction."""
+    db.create_all()
+    applied = []
+    for version, description, migrate in pending_migrations():
+        with db.engine.begin() as connection:
+            migrate(connection)
+            connection.execute(insert(SchemaMigration.__table__).values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append((version, description))
+    return applied
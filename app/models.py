@@ -33,6 +33,18 @@ class Item(db.Model):
 
 
 class Transfer(db.Model):
+    # New indexes also need a step in app/migrations.py to reach existing databases
+    __table_args__ = (
+        db.Index('ix_transfer_completed_date_created', 'completed', 'date_created', 'id'),
+        db.Index('ix_transfer_date_created', 'date_created', 'id'),
+        db.Index('ix_transfer_to_location_completed', 'to_location_id', 'completed'),
+        db.Index('ix_transfer_from_location', 'from_location_id'),
+        # Never hand out an id again once it is deleted or archived
+        {'sqlite_autoincrement': True},
+    )
+
+    archived = False
+
     id = db.Column(db.Integer, primary_key=True)
     from_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
     to_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
@@ -47,8 +59,141 @@ class Transfer(db.Model):
 
 
 class TransferItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_transfer_item_transfer_id', 'transfer_id'),
+        db.Index('ix_transfer_item_item_id', 'item_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     transfer_id = db.Column(db.Integer, db.ForeignKey('transfer.id'), nullable=False)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    item = relationship('Item', backref='transfer_items', lazy=True)
\ No newline at end of file
+    item = relationship('Item', backref='transfer_items', lazy=True)
+
+
+class ArchivedTransfer(db.Model):
+    # Completed transfers moved out of the hot tables by app/archive.py, keeping their ids
+    __table_args__ = (
+        db.Index('ix_archived_transfer_date_created', 'date_created', 'id'),
+        db.Index('ix_archived_transfer_to_location', 'to_location_id'),
+    )
+
+    archived = True
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    from_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    to_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date_created = db.Column(db.DateTime, nullable=False)
+    completed = db.Column(db.Boolean, default=True, nullable=False)
+
+    from_location = relationship('Location', foreign_keys=[from_location_id])
+    to_location = relationship('Location', foreign_keys=[to_location_id])
+    creator = relationship('User')
+
+
+class ArchivedTransferItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_archived_transfer_item_transfer_id', 'transfer_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transfer_id = db.Column(db.Integer, db.ForeignKey('archived_transfer.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    item = relationship('Item', lazy=True)
+
+
+class LocationStock(db.Model):
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    item = relationship('Item', lazy=True)
+
+
+class StockMovement(db.Model):
+    # Append-only log of every change to LocationStock; never updated or deleted
+    __table_args__ = (
+        db.Index('ix_stock_movement_location_id', 'location_id', 'id'),
+        db.Index('ix_stock_movement_recorded_at', 'recorded_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    transfer_id = db.Column(db.Integer)  # No foreign key: transfers may be deleted; None for corrections
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+
+class StockSnapshot(db.Model):
+    # Stock balances after every movement up to last_movement_id, taken by app/stock_history.py
+    id = db.Column(db.Integer, primary_key=True)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_movement_id = db.Column(db.Integer, nullable=False)
+
+
+class StockSnapshotLine(db.Model):
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('stock_snapshot.id'), primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+
+class TransferRollup(db.Model):
+    # Completed transfer quantities summed per hour or day bucket of Transfer.date_created
+    granularity = db.Column(db.String(4), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    from_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    to_location_id = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+    # Per-table change counter, bumped on every commit that writes to the table
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchemaMigration(db.Model):
+    # One row per step of app/migrations.py applied to this database
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TransferChange(db.Model):
+    # Ordered log of transfer changes; clients replay it after reconnecting (seq is the cursor)
+    seq = db.Column(db.Integer, primary_key=True)
+    transfer_id = db.Column(db.Integer, nullable=False)  # No foreign key: deletions are logged too
+    event = db.Column(db.String(32), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class Job(db.Model):
+    # Background work run by app/jobs.py; params and result hold JSON
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    params = db.Column(db.Text, nullable=False, default='{}')
+    result = db.Column(db.Text)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime, index=True)
+    # The process running the job and when it last confirmed it is still alive
+    worker = db.Column(db.String(128))
+    heartbeat_at = db.Column(db.DateTime)
+
+
+class ApiToken(db.Model):
+    # Bearer tokens for API clients; only a SHA-256 hash of the token is stored
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime)
@@ -0,0 +1,138 @@
+import threading
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models import Transfer, TransferChange
+
+ALL_TRANSFERS_ROOM = 'transfers'
+
+
+def location_room(location_id):
+    return f'location-{location_id}'
+
+
+def transfer_payload(transfer):
+    # The row data the transfer list needs, so clients can patch their table in place
+    return {
+        'id': transfer.id,
+        'from_location': {'id': transfer.from_location_id, 'name': transfer.from_location.name},
+        'to_location': {'id': transfer.to_location_id, 'name': transfer.to_location.name},
+        'user_id': transfer.user_id,
+        'date_created': transfer.date_created.isoformat(),
+        'completed': transfer.completed,
+        'archived': transfer.archived
+    }
+
+
+def record_change(event, transfer):
+    """Log a transfer change in the current transaction; publish it once committed."""
+    change = TransferChange(transfer_id=transfer.id, event=event)
+    db.session.add(change)
+    return change
+
+
+def record_changes(event, transfer_ids):
+    """Log the same change for many transfers with one INSERT; returns their seqs in order."""
+    return list(db.session.scalars(
+        insert(TransferChange).returning(TransferChange.seq, sort_by_parameter_order=True),
+        [{'transfer_id': transfer_id, 'event': event} for transfer_id in transfer_ids]))
+
+
+def latest_change():
+    return db.session.scalar(select(func.max(TransferChange.seq))) or 0
+
+
+def changes_since(since, limit):
+    """Return ``(changes, cursor, more)`` for the transfer changes logged after ``since``.
+
+    Each transfer appears once with its current row data, or ``None`` if it has been deleted.
+    ``changes`` is ``None`` when the log no longer reaches back to ``since`` and the client
+    has to reload instead.
+    """
+    oldest = db.session.scalar(select(func.min(TransferChange.seq)))
+    if oldest is not None and since < oldest - 1:
+        return None, latest_change(), False
+
+    rows = db.session.execute(select(TransferChange.seq, TransferChange.transfer_id, TransferChange.event)
+                              .where(TransferChange.seq > since)
+                              .order_by(TransferChange.seq).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    latest = {transfer_id: (seq, event) for seq, transfer_id, event in rows}
+    transfers = {transfer.id: transfer for transfer in db.session.scalars(
+        select(Transfer).options(joinedload(Transfer.from_location), joinedload(Transfer.to_location))
+        .where(Transfer.id.in_(latest)))} if latest else {}
+
+    changes = []
+    for transfer_id, (seq, event) in sorted(latest.items(), key=lambda entry: entry[1][0]):
+        transfer = transfers.get(transfer_id)
+        changes.append({'type': event, 'seq': seq, 'id': transfer_id,
+                        'transfer': transfer_payload(transfer) if transfer else None})
+    return changes, rows[-1].seq if rows else since, more
+
+
+def prune_changes(before):
+    """Delete changes logged before ``before``, always keeping the latest one as the cursor floor."""
+    result = db.session.execute(delete(TransferChange).where(TransferChange.changed_at < before,
+                                                             TransferChange.seq < latest_change()))
+    db.session.commit()
+    return result.rowcount
+
+
+class TransferNotifier:
+    """Pushes transfer changes to the Socket.IO rooms of the locations involved.
+
+    Events raised within SOCKETIO_COALESCE_WINDOW seconds are batched into a single
+    ``transfer_events`` message per room, keeping only the latest event of each transfer,
+    so a burst of changes wakes every client once instead of once per change.
+    """
+
+    def __init__(self):
+        self.socketio = None
+        self.window = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._scheduled = False
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.window = app.config['SOCKETIO_COALESCE_WINDOW']
+
+    def publish(self, change, payload, previous_location_ids=()):
+        self._publish([(change.event, change.seq, payload, previous_location_ids)])
+
+    def publish_many(self, event, changes):
+        """Publish ``(seq, payload)`` pairs of one bulk operation as a single batch."""
+        self._publish([(event, seq, payload, ()) for seq, payload in changes])
+
+    def _publish(self, entries):
+        with self._lock:
+            for event, seq, payload, previous_location_ids in entries:
+                location_ids = {payload['from_location']['id'], payload['to_location']['id'], *previous_location_ids}
+                message = {'type': event, 'seq': seq, 'id': payload['id'], 'transfer': payload}
+                for location_id in location_ids:
+                    self._pending.setdefault(location_room(location_id), {})[payload['id']] = message
+                self._pending.setdefault(ALL_TRANSFERS_ROOM, {})[payload['id']] = message
+            schedule = self.window > 0 and not self._scheduled
+            if schedule:
+                self._scheduled = True
+        if self.window <= 0:
+            self.flush()
+        elif schedule:
+            self.socketio.start_background_task(self._flush_later)
+
+    def _flush_later(self):
+        self.socketio.sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        for room, events in pending.items():
+            self.socketio.emit('transfer_events', {'events': list(events.values())}, to=room)
+
+
+notifier = TransferNotifier()
@@ -0,0 +1,56 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(date_created, row_id):
+    raw = f'{date_created.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(date_created, id)`` pair stored in a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_part, id_part = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _page_rows(query, date_column, id_column, position, limit):
+    if position:
+        date_created, row_id = position
+        query = query.filter(or_(date_column < date_created,
+                                 and_(date_column == date_created, id_column < row_id)))
+
+    # Fetch one extra row to find out whether there is a next page without a COUNT
+    return query.order_by(date_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+
+def keyset_page(query, date_column, id_column, cursor, limit, archive=None):
+    """Return one page of ``query`` ordered newest first, plus the cursor of the next page.
+
+    Rows are ordered on ``(date_column, id_column)`` descending and the cursor holds the
+    position of the last row returned, so fetching any page is an index range scan no
+    matter how deep into the history it is.
+
+    ``archive`` is an optional older tier given as ``(query, date_column, id_column, horizon)``
+    whose rows are all dated at or before ``horizon``. It is only read once the page reaches
+    back to the horizon, and its rows are merged in order.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    rows = _page_rows(query, date_column, id_column, position, limit)
+    if archive is not None:
+        archive_query, archive_date_column, archive_id_column, horizon = archive
+        if len(rows) <= limit or rows[-1].date_created <= horizon:
+            rows += _page_rows(archive_query, archive_date_column, archive_id_column, position, limit)
+            rows = sorted(rows, key=lambda row: (row.date_created, row.id), reverse=True)[:limit + 1]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date_created, rows[-1].id)
+    return rows, next_cursor
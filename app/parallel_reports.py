@@ -0,0 +1,90 @@
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from flask import current_app
+
+from app import db, report_worker
+from app.rollups import DAY, HOUR, bucket_start, report_totals
+
+# The pool starts from request or job threads, and forking a threaded process can copy a lock
+# mid-use into the child. A fork server that only preloads the worker module avoids that
+# without re-importing run.py, which creates the app at import time, as spawn does.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _CONTEXT = multiprocessing.get_context('forkserver')
+    _CONTEXT.set_forkserver_preload([report_worker.__name__])
+else:
+    _CONTEXT = multiprocessing.get_context('spawn')
+
+
+def partition_range(start, end, count):
+    """Split ``start..end`` into up to ``count`` ``(start, end, include_end)`` ranges cut on day or hour starts."""
+    step = (end - start) / count
+    unit = DAY if step >= timedelta(days=1) else HOUR
+    cuts = sorted({bucket_start(start + step * index, unit) for index in range(1, count)})
+    bounds = [start] + [cut for cut in cuts if start < cut < end] + [end]
+    return [(bounds[index], bounds[index + 1], index == len(bounds) - 2) for index in range(len(bounds) - 1)]
+
+
+class ParallelReports:
+    """Computes long-range report totals on a process pool, one date partition per task.
+
+    Each worker aggregates its partitions on its own database connection and the partial
+    (from, to, item) sums are added up here. Off while REPORT_WORKERS is 0, and ranges
+    shorter than REPORT_PARALLEL_MIN_DAYS always take the single-process path.
+    """
+
+    def __init__(self):
+        self.uri = None
+        self.workers = 0
+        self.partitions = 0
+        self.min_span = timedelta(0)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.configure(db.engine.url.render_as_string(hide_password=False), app.config['REPORT_WORKERS'],
+                       app.config['REPORT_PARTITIONS'], timedelta(days=app.config['REPORT_PARALLEL_MIN_DAYS']))
+
+    def configure(self, uri, workers, partitions=0, min_span=timedelta(0)):
+        self.shutdown()
+        self.uri = uri
+        self.workers = workers
+        # A few partitions per worker even out ranges where activity is uneven
+        self.partitions = partitions or workers * 2
+        self.min_span = min_span
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=_CONTEXT,
+                                                     initializer=report_worker.start, initargs=(self.uri,))
+            return self._executor
+
+    def report_totals(self, start, end, use_rollups=True):
+        if self.workers < 1 or end - start < self.min_span:
+            return report_totals(start, end, use_rollups=use_rollups)
+
+        try:
+            futures = [self._pool().submit(report_worker.partition_totals, *bounds, use_rollups)
+                       for bounds in partition_range(start, end, self.partitions)]
+            totals = Counter()
+            for future in futures:
+                totals.update(future.result())
+            return totals
+        except BrokenProcessPool:
+            current_app.logger.warning('Report worker pool failed; computing the report in-process')
+            self.shutdown()
+            return report_totals(start, end, use_rollups=use_rollups)
+
+
+parallel_reports = ParallelReports()
@@ -0,0 +1,72 @@
+import time
+
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from app import db
+from app.lru import TTLCache
+from app.models import User
+from app.versioning import current_versions
+
+
+class UserPrincipal(UserMixin):
+    """The fields of a user that requests need to identify and authorise the caller."""
+
+    def __init__(self, id, email, is_admin, active):
+        self.id = id
+        self.email = email
+        self.is_admin = is_admin
+        self.active = active
+
+
+class PrincipalCache:
+    """Recently loaded user principals, so authenticated requests skip the user query.
+
+    Entries expire after USER_CACHE_TTL seconds and the least recently used are evicted past
+    USER_CACHE_MAX_ENTRIES. Admin changes to a user invalidate its entry in this process.
+    Any commit that writes users also bumps the user table version in every process, which
+    this cache reads at most every USER_CACHE_VERSION_CHECK seconds; entries read before the
+    latest version seen are reloaded. A deleted or demoted user is thus served from other
+    processes' caches for at most that long, and cache hits in between run no query.
+    """
+
+    def __init__(self):
+        self._entries = TTLCache()
+        self._check_interval = 0
+        self._version = None
+        self._checked_at = None
+
+    def init_app(self, app):
+        self._entries = TTLCache(app.config['USER_CACHE_TTL'], app.config['USER_CACHE_MAX_ENTRIES'])
+        self._check_interval = app.config['USER_CACHE_VERSION_CHECK']
+
+    def _current_version(self):
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self._check_interval:
+            (self._version,) = current_versions('user')
+            self._checked_at = now
+        return self._version
+
+    def load(self, user_id):
+        version = self._current_version()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        row = db.session.execute(select(User.id, User.email, User.is_admin, User.active)
+                                 .where(User.id == user_id)).first()
+        if row is None:
+            self._entries.pop(user_id)
+            return None
+        principal = UserPrincipal(*row)
+        self._entries.put(user_id, (version, principal))
+        return principal
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id)
+
+
+user_cache = PrincipalCache()
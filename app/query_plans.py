@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from sqlalchemy import select, text
+
+from app import db
+from app.models import ArchivedTransfer, ArchivedTransferItem, Transfer, TransferItem
+
+
+def hot_queries():
+    """The statements behind the busiest pages, with the index each one is expected to use."""
+    moment = datetime(2024, 1, 1)
+    return [
+        ('view_transfers (not completed page)',
+         select(Transfer.id).where(Transfer.completed == False)
+         .order_by(Transfer.date_created.desc(), Transfer.id.desc()).limit(51),
+         'ix_transfer_completed_date_created'),
+        ('view_transfers (all transfers page)',
+         select(Transfer.id).order_by(Transfer.date_created.desc(), Transfer.id.desc()).limit(51),
+         'ix_transfer_date_created'),
+        ('edit_location (completed transfers to location)',
+         select(Transfer.id).where(Transfer.to_location_id == 1, Transfer.completed == True),
+         'ix_transfer_to_location_completed'),
+        ('generate_report (raw range edge)',
+         select(Transfer.from_location_id, Transfer.to_location_id, TransferItem.item_id, TransferItem.quantity)
+         .join(TransferItem, Transfer.id == TransferItem.transfer_id)
+         .where(Transfer.completed == True, Transfer.date_created >= moment, Transfer.date_created < moment),
+         'ix_transfer_item_transfer_id'),
+        ('generate_report (archived range edge)',
+         select(ArchivedTransfer.from_location_id, ArchivedTransfer.to_location_id, ArchivedTransferItem.item_id,
+                ArchivedTransferItem.quantity)
+         .join(ArchivedTransferItem, ArchivedTransfer.id == ArchivedTransferItem.transfer_id)
+         .where(ArchivedTransfer.completed == True, ArchivedTransfer.date_created >= moment,
+                ArchivedTransfer.date_created < moment),
+         'ix_archived_transfer_item_transfer_id'),
+        ('view_transfer (transfer lines)',
+         select(TransferItem.id).where(TransferItem.transfer_id == 1),
+         'ix_transfer_item_transfer_id'),
+    ]
+
+
+def explain(statement):
+    dialect = db.engine.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as connection:
+        rows = connection.execute(text(prefix + sql)).all()
+    # SQLite puts the plan text in the last column, PostgreSQL returns it as the only one
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def check_query_plans():
+    """Return ``(name, expected_index, plan, uses_index)`` for every hot query."""
+    results = []
+    for name, statement, expected_index in hot_queries():
+        plan = explain(statement)
+        results.append((name, expected_index, plan, expected_index in plan))
+    return results
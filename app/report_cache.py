@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class ReportCache:
+    """Generated reports kept in a local SQLite file, evicted by age and least recent use.
+
+    Reports are stored under a key derived from their parameters and the data versions
+    they were computed from, so an identical request is answered from the cache until
+    the underlying tables change.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.max_entries = None
+        self.ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('REPORT_CACHE_PATH') or os.path.join(app.instance_path, 'report_cache.sqlite')
+        self.max_entries = app.config['REPORT_CACHE_MAX_ENTRIES']
+        self.ttl = app.config['REPORT_CACHE_TTL']
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS report ('
+                               'id TEXT PRIMARY KEY, payload TEXT NOT NULL, '
+                               'created REAL NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_report_accessed ON report (accessed)')
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()[:32]
+
+    def get(self, report_id):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute('SELECT payload FROM report WHERE id = ? AND created > ?',
+                                     (report_id, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE report SET accessed = ? WHERE id = ?', (now, report_id))
+        return json.loads(row[0])
+
+    def put(self, report_id, payload):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO report (id, payload, created, accessed) VALUES (?, ?, ?, ?)',
+                               (report_id, json.dumps(payload), now, now))
+            connection.execute('DELETE FROM report WHERE created <= ?', (now - self.ttl,))
+            connection.execute('DELETE FROM report WHERE id IN '
+                               '(SELECT id FROM report ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                               (self.max_entries,))
+        return report_id
+
+
+report_cache = ReportCache()
@@ -0,0 +1,17 @@
+"""Entry point of the report worker processes, which only need the rollups and an engine."""
+from sqlalchemy import create_engine
+
+from app.rollups import report_totals
+
+# The engine of the current worker process, created once by start
+_engine = None
+
+
+def start(uri):
+    global _engine
+    _engine = create_engine(uri)
+
+
+def partition_totals(start, end, include_end, use_rollups):
+    with _engine.connect() as connection:
+        return report_totals(start, end, include_end, use_rollups, execute=connection.execute)
@@ -0,0 +1,159 @@
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.archive import TIERS, archive_horizon, reaches_archive
+from app.models import Item, Location, TransferRollup
+
+HOUR = 'hour'
+DAY = 'day'
+GRANULARITIES = {HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+RESOLUTION = timedelta(microseconds=1)
+
+
+def bucket_start(moment, granularity):
+    if granularity == DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket_ceil(moment, granularity):
+    start = bucket_start(moment, granularity)
+    return start if start == moment else start + GRANULARITIES[granularity]
+
+
+def rollup_rows(movements, sign):
+    """Return the rollup increments for ``movements`` as rows for ``ledger.increment``."""
+    totals = Counter()
+    for movement in movements:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(movement.date_created, granularity),
+                   movement.from_location_id, movement.to_location_id, movement.item_id)
+            totals[key] += sign * movement.quantity
+    return [{'granularity': granularity, 'bucket': bucket, 'from_location_id': from_id,
+             'to_location_id': to_id, 'item_id': item_id, 'quantity': quantity}
+            for (granularity, bucket, from_id, to_id, item_id), quantity in totals.items() if quantity]
+
+
+def _raw_totals(execute, start, end, include_end=False, horizon=None):
+    # The archive tables are only read when the range starts at or before the archive horizon
+    rows = []
+    for index, (transfers, lines) in enumerate(TIERS):
+        if index and not reaches_archive(start, horizon):
+            break
+        end_condition = transfers.date_created <= end if include_end else transfers.date_created < end
+        rows += execute(
+            select(transfers.from_location_id, transfers.to_location_id, lines.item_id, func.sum(lines.quantity))
+            .join(lines, transfers.id == lines.transfer_id)
+            .where(transfers.completed == True, transfers.date_created >= start, end_condition)
+            .group_by(transfers.from_location_id, transfers.to_location_id, lines.item_id)).all()
+    return rows
+
+
+def _rollup_totals(execute, granularity, start, end):
+    return execute(
+        select(TransferRollup.from_location_id, TransferRollup.to_location_id, TransferRollup.item_id,
+               func.sum(TransferRollup.quantity))
+        .where(TransferRollup.granularity == granularity, TransferRollup.bucket >= start,
+               TransferRollup.bucket < end)
+        .group_by(TransferRollup.from_location_id, TransferRollup.to_location_id, TransferRollup.item_id)).all()
+
+
+def report_totals(start, end, include_end=True, use_rollups=True, execute=None):
+    """Sum completed quantities per (from, to, item) id for ``start <= date_created <= end``.
+
+    Whole days and hours inside the range are read from the rollups; only the partial
+    hours at either edge touch the raw transfer rows, or every row with ``use_rollups=False``.
+    Without ``include_end`` the range is half-open. ``execute`` runs the statements,
+    ``db.session.execute`` by default, so the report can be computed on any connection.
+    """
+    execute = execute or db.session.execute
+    horizon = archive_horizon(execute)
+    totals = Counter()
+
+    def add(rows):
+        for from_id, to_id, item_id, quantity in rows:
+            totals[(from_id, to_id, item_id)] += quantity
+
+    hours_start = _bucket_ceil(start, HOUR)
+    hours_end = bucket_start(end + RESOLUTION if include_end else end, HOUR)
+    if not use_rollups or hours_start >= hours_end:
+        add(_raw_totals(execute, start, end, include_end, horizon))
+        return totals
+
+    days_start = _bucket_ceil(hours_start, DAY)
+    days_end = bucket_start(hours_end, DAY)
+    if days_start < days_end:
+        add(_rollup_totals(execute, HOUR, hours_start, days_start))
+        add(_rollup_totals(execute, DAY, days_start, days_end))
+        add(_rollup_totals(execute, HOUR, days_end, hours_end))
+    else:
+        add(_rollup_totals(execute, HOUR, hours_start, hours_end))
+    add(_raw_totals(execute, start, hours_start, horizon=horizon))
+    add(_raw_totals(execute, hours_end, end, include_end, horizon))
+    return totals
+
+
+def named_report(totals):
+    """Turn ``(from, to, item)`` id totals into the rows shown on the report, ordered by name."""
+    location_ids = {key[0] for key in totals} | {key[1] for key in totals}
+    item_ids = {key[2] for key in totals}
+    locations = dict(db.session.execute(select(Location.id, Location.name).where(Location.id.in_(location_ids))).all())
+    items = dict(db.session.execute(select(Item.id, Item.name).where(Item.id.in_(item_ids))).all())
+
+    report = [{
+        'from_location_name': locations.get(from_id),
+        'to_location_name': locations.get(to_id),
+        'item_name': items.get(item_id),
+        'total_quantity': quantity
+    } for (from_id, to_id, item_id), quantity in totals.items() if quantity]
+    report.sort(key=lambda row: (row['from_location_name'] or '', row['to_location_name'] or '',
+                                 row['item_name'] or ''))
+    return report
+
+
+def _recomputed_rollups(execute):
+    totals = Counter()
+    for transfers, lines in TIERS:
+        rows = execute(
+            select(transfers.date_created, transfers.from_location_id, transfers.to_location_id, lines.item_id,
+                   lines.quantity)
+            .join(lines, transfers.id == lines.transfer_id)
+            .where(transfers.completed == True)
+            .execution_options(yield_per=5000))
+        for date_created, from_id, to_id, item_id, quantity in rows:
+            for granularity in GRANULARITIES:
+                totals[(granularity, bucket_start(date_created, granularity), from_id, to_id, item_id)] += quantity
+    return totals
+
+
+def rebuild_rollups(execute=None):
+    """Recompute every rollup bucket from the transfer history; returns the number of buckets.
+
+    ``execute`` runs the statements on another connection, whose owner then commits.
+    """
+    commit = execute is None
+    execute = execute or db.session.execute
+    totals = _recomputed_rollups(execute)
+    execute(delete(TransferRollup))
+    rows = [{'granularity': granularity, 'bucket': bucket, 'from_location_id': from_id,
+             'to_location_id': to_id, 'item_id': item_id, 'quantity': quantity}
+            for (granularity, bucket, from_id, to_id, item_id), quantity in totals.items() if quantity]
+    if rows:
+        execute(insert(TransferRollup), rows)
+    if commit:
+        db.session.commit()
+    return len(rows)
+
+
+def check_rollups():
+    """Return ``(key, stored, expected)`` for every rollup bucket that disagrees with the raw rows."""
+    expected = _recomputed_rollups(db.session.execute)
+    stored = Counter()
+    for rollup in db.session.execute(select(TransferRollup)).scalars():
+        stored[(rollup.granularity, rollup.bucket, rollup.from_location_id, rollup.to_location_id,
+                rollup.item_id)] += rollup.quantity
+    return [(key, stored[key], expected[key]) for key in sorted(set(stored) | set(expected))
+            if stored[key] != expected[key]]
@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, abort
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, Response, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 
-from app.forms import LoginForm, UserForm, SignupForm
+from app.forms import LoginForm, UserForm, SignupForm, ResetMetricsForm
+from app.instrumentation import metrics
+from app.principals import user_cache
 from app.models import User, db
 
 auth = Blueprint('auth', __name__)
@@ -28,9 +30,7 @@ def login():
         login_user(user)
         return redirect(url_for('main.home'))
 
-    from run import app
-
-    return render_template('auth/login.html', form=form, demo=app.config['DEMO'])
+    return render_template('auth/login.html', form=form, demo=current_app.config['DEMO'])
 
 
 @auth.route('/logout')
@@ -49,6 +49,7 @@ def activate_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = True
     db.session.commit()
+    user_cache.invalidate(user.id)
     flash('User account activated.', 'success')
     return redirect(url_for('admin_dashboard'))  # Redirect to an admin page
 
@@ -72,6 +73,7 @@ def users():
             elif action == 'toggle_admin':
                 user.is_admin = not user.is_admin
             db.session.commit()
+            user_cache.invalidate(user.id)
             flash('User updated successfully', 'success')
         else:
             flash('User not found', 'danger')
@@ -114,5 +116,31 @@ def delete_user(user_id):
     user_to_delete = User.query.get_or_404(user_id)
     db.session.delete(user_to_delete)
     db.session.commit()
+    user_cache.invalidate(user_id)
     flash('User deleted successfully.', 'success')
-    return redirect(url_for('admin.users'))
\ No newline at end of file
+    return redirect(url_for('admin.users'))
+
+
+@admin.route('/controlpanel/metrics', methods=['GET', 'POST'])
+@login_required
+def view_metrics():
+    if not current_user.is_admin:
+        abort(403)
+
+    if request.method == 'POST':
+        metrics.reset()
+        flash('Metrics reset.', 'success')
+        return redirect(url_for('admin.view_metrics'))
+    form = ResetMetricsForm()
+    return render_template('admin/view_metrics.html', metrics=metrics, form=form)
+
+
+@admin.route('/controlpanel/metrics.txt', methods=['GET'])
+@login_required
+def export_metrics():
+    if not current_user.is_admin:
+        abort(403)
+    if not metrics.enabled:
+        abort(404)
+
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
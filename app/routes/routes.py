@@ -1,18 +1,41 @@
-import os
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session
-from flask_login import login_required, current_user
-from sqlalchemy import func
-from werkzeug.utils import secure_filename
+from datetime import datetime
 
-from app import db, socketio
-from app.forms import LocationForm, ItemForm, TransferForm, ImportItemsForm, DateRangeForm
-from app.models import Location, Item, Transfer, TransferItem
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, abort, \
+    Response, send_file, stream_with_context, g
+from flask_login import login_required, current_user
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from app import csrf, db, ledger
+from app.api_tokens import token_required
+from app.forms import LocationForm, ItemForm, TransferForm, TransferActionForm, ImportItemsForm, DateRangeForm
+from app.archive import archive_horizon
+from app.models import Location, Item, Transfer, TransferItem, ArchivedTransfer, ArchivedTransferItem, Job
+from app.exports import TRANSFER_LINE_HEADER, REPORT_HEADER, transfer_line_rows, report_rows, csv_chunks, \
+    xlsx_file
+from app.http_cache import response_cache
+from app.ingest import ingest_transfers
+from app.jobs import job_runner, job_payload, DONE, FINISHED
+from app.notifications import notifier, transfer_payload, record_change, record_changes, changes_since, \
+    latest_change
+from app.pagination import keyset_page
+from app.report_cache import report_cache
+from app.search import execute_item_statement, find_items
+from app.stock_history import stock_at
+from app.versioning import current_versions
 
 # If you're not already using a Blueprint for your main routes, create one.
 main = Blueprint('main', __name__)
 location = Blueprint('locations', __name__)
 item = Blueprint('item', __name__)
 transfer = Blueprint('transfer', __name__)
+job = Blueprint('job', __name__)
+
+# Upper bound on the page size API clients can request
+MAX_API_PAGE_SIZE = 500
+# Upper bound on the transfers one bulk request may change
+MAX_BULK_TRANSFERS = 1000
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
 
 @main.route('/')
@@ -50,11 +73,39 @@ def edit_location(location_id):
     transfers_to_location = Transfer.query.filter_by(to_location_id=location_id, completed=True).all()
 
     return render_template('locations/edit_location.html', form=form, location=location,
-                           transfers=transfers_to_location)
+                           transfers=transfers_to_location, stock=ledger.location_stock(location_id),
+                           archive_horizon=archive_horizon())
+
+
+@location.route('/api/stock', methods=['GET'])
+@login_required
+def api_stock():
+    # Stock per location and item as it stood at ``at`` (ISO date and time, default now)
+    try:
+        moment = datetime.fromisoformat(request.args['at']) if request.args.get('at') else datetime.utcnow()
+    except ValueError:
+        abort(400)
+    history = stock_at(moment, request.args.get('location_id', type=int), request.args.get('item_id', type=int))
+    if history is None:
+        abort(404)  # Before the stock history starts
+    snapshot, balances = history
+
+    locations = dict(db.session.execute(select(Location.id, Location.name)
+                                        .where(Location.id.in_({key[0] for key in balances}))).all())
+    items = dict(db.session.execute(select(Item.id, Item.name).where(Item.id.in_({key[1] for key in balances}))).all())
+    return jsonify({
+        'at': moment.isoformat(),
+        'snapshot': {'id': snapshot.id, 'taken_at': snapshot.taken_at.isoformat()},
+        'stock': [{'location': {'id': location_id, 'name': locations.get(location_id)},
+                   'item': {'id': item_id, 'name': items.get(item_id)},
+                   'quantity': quantity}
+                  for (location_id, item_id), quantity in sorted(balances.items())]
+    })
 
 
 @location.route('/locations')
 @login_required
+@response_cache.cached('location')
 def view_locations():
     locations = Location.query.all()
     return render_template('locations/view_locations.html', locations=locations)
@@ -72,6 +123,7 @@ def delete_location(location_id):
 
 @item.route('/items')
 @login_required
+@response_cache.cached('item')
 def view_items():
     items = Item.query.all()
     form = ItemForm()
@@ -117,9 +169,9 @@ def delete_item(item_id):
 @item.route('/items/bulk_delete', methods=['POST'])
 @login_required
 def bulk_delete_items():
-    item_ids = request.form.getlist('item_ids')
+    item_ids = [int(item_id) for item_id in request.form.getlist('item_ids') if item_id.isdigit()]
     if item_ids:
-        Item.query.filter(Item.id.in_(item_ids)).delete(synchronize_session='fetch')
+        execute_item_statement(delete(Item).where(Item.id.in_(item_ids)), 'remove')
         db.session.commit()
         flash('Selected items have been deleted.', 'success')
     else:
@@ -127,35 +179,134 @@ def bulk_delete_items():
     return redirect(url_for('item.view_items'))
 
 
+def _filtered_transfers(args, model=Transfer):
+    filter_option = args.get('filter', 'not_completed')
+    transfer_id = args.get('transfer_id', type=int)  # Optional: Search by Transfer ID
+    from_location_name = args.get('from_location', '')  # Optional: Search by From Location
+    to_location_name = args.get('to_location', '')  # Optional: Search by To Location
+
+    # Load both locations with the transfers so rendering a page does not query per row
+    query = model.query.options(joinedload(model.from_location), joinedload(model.to_location))
+    if transfer_id is not None:
+        query = query.filter(model.id == transfer_id)
+
+    if from_location_name:
+        from_location = db.aliased(Location)
+        query = query.join(from_location, model.from_location_id == from_location.id).filter(
+            from_location.name.ilike(f"%{from_location_name}%"))
+
+    if to_location_name:
+        to_location = db.aliased(Location)
+        query = query.join(to_location, model.to_location_id == to_location.id).filter(
+            to_location.name.ilike(f"%{to_location_name}%"))
+
+    if filter_option == 'completed':
+        query = query.filter(model.completed == True)
+    elif filter_option == 'not_completed':
+        query = query.filter(model.completed == False)
+
+    return query
+
+
+def _transfer_page(args, cursor, limit):
+    archive = None
+    # Only completed transfers are archived, and only pages reaching back to the horizon read them
+    if args.get('filter', 'not_completed') != 'not_completed':
+        horizon = archive_horizon()
+        if horizon is not None:
+            archive = (_filtered_transfers(args, ArchivedTransfer), ArchivedTransfer.date_created,
+                       ArchivedTransfer.id, horizon)
+    return keyset_page(_filtered_transfers(args), Transfer.date_created, Transfer.id, cursor, limit, archive)
+
+
+def _submitted_lines(form):
+    """Return the submitted transfer lines as ``{item_id: quantity}`` for items that exist.
+
+    Lines are posted as ``items-<n>-item``/``items-<n>-quantity`` pairs, where several lines
+    may share an index, so values are paired up per index. Quantities of repeated items are
+    summed and every item id is checked with a single query.
+    """
+    lines = {}
+    for key in form.keys():
+        if not (key.startswith('items-') and key.endswith('-item')):
+            continue
+        prefix = key[:-len('-item')]
+        for item_id, quantity in zip(form.getlist(key), form.getlist(f'{prefix}-quantity')):
+            try:
+                item_id, quantity = int(item_id), int(quantity)
+            except ValueError:
+                continue
+            if quantity:
+                lines[item_id] = lines.get(item_id, 0) + quantity
+
+    known = set(db.session.execute(select(Item.id).where(Item.id.in_(lines))).scalars()) if lines else set()
+    return {item_id: quantity for item_id, quantity in lines.items() if item_id in known}
+
+
 @transfer.route('/transfers', methods=['GET'])
 @login_required
 def view_transfers():
-    filter_option = request.args.get('filter', 'not_completed')
-    transfer_id = request.args.get('transfer_id', '', type=int)  # Optional: Search by Transfer ID
-    from_location_name = request.args.get('from_location', '')  # Optional: Search by From Location
-    to_location_name = request.args.get('to_location', '')  # Optional: Search by To Location
+    # Read before the page so changes made while it renders are replayed, not missed
+    change_cursor = latest_change()
+    cursor = request.args.get('cursor')
+    transfers, next_cursor = _transfer_page(request.args, cursor, current_app.config['TRANSFERS_PER_PAGE'])
 
-    query = Transfer.query
-    if transfer_id is not '':
-        query = query.filter(Transfer.id == transfer_id)
+    # Carry the search filters over to the pagination links
+    filters = {key: value for key, value in request.args.items() if key != 'cursor' and value}
 
-    if from_location_name is not '':
-        query = query.join(Location, Transfer.from_location_id == Location.id).filter(
-            Location.name.ilike(f"%{from_location_name}%"))
+    # Live updates: filtered lists only listen to the locations their filters match
+    location_names = [name for name in (request.args.get('from_location'), request.args.get('to_location')) if name]
+    subscription = {'all': True}
+    if location_names:
+        subscription = {'locations': list(db.session.scalars(
+            select(Location.id).where(or_(*[Location.name.ilike(f'%{name}%') for name in location_names]))))}
 
-    if to_location_name is not '':
-        query = query.join(Location, Transfer.to_location_id == Location.id).filter(
-            Location.name.ilike(f"%{to_location_name}%"))
+    form = TransferActionForm()
+    return render_template('transfers/view_transfers.html', transfers=transfers, form=form,
+                           next_cursor=next_cursor, cursor=cursor, filters=filters, subscription=subscription,
+                           change_cursor=change_cursor)
 
-    if filter_option == 'completed':
-        transfers = query.filter(Transfer.completed == True).all()
-    elif filter_option == 'not_completed':
-        transfers = query.filter(Transfer.completed == False).all()
-    else:
-        transfers = query.all()
 
-    form = TransferForm()  # Assuming you're using it for something like a filter form on the page
-    return render_template('transfers/view_transfers.html', transfers=transfers, form=form)
+@transfer.route('/api/transfers', methods=['GET'])
+@login_required
+def api_transfers():
+    limit = request.args.get('limit', current_app.config['TRANSFERS_PER_PAGE'], type=int)
+    limit = max(1, min(limit, MAX_API_PAGE_SIZE))
+    transfers, next_cursor = _transfer_page(request.args, request.args.get('cursor'), limit)
+    return jsonify({
+        'transfers': [transfer_payload(transfer) for transfer in transfers],
+        'next_cursor': next_cursor
+    })
+
+
+@transfer.route('/api/transfers/changes', methods=['GET'])
+@login_required
+def api_transfer_changes():
+    limit = max(1, min(request.args.get('limit', MAX_API_PAGE_SIZE, type=int), MAX_API_PAGE_SIZE))
+    changes, cursor, more = changes_since(request.args.get('since', 0, type=int), limit)
+    if changes is None:
+        return jsonify({'reset': True, 'cursor': cursor})
+    return jsonify({'reset': False, 'changes': changes, 'cursor': cursor, 'more': more})
+
+
+@transfer.route('/api/transfers/batch', methods=['POST'])
+@csrf.exempt
+@token_required
+def ingest_transfer_batch():
+    # For scanners and integrations: many transfers per request, see app/ingest.py for the record format
+    payload = request.get_json(silent=True)
+    records = payload.get('transfers') if isinstance(payload, dict) else None
+    if not isinstance(records, list):
+        abort(400)
+    if len(records) > current_app.config['API_MAX_BATCH_SIZE']:
+        abort(413)
+
+    results, transfer_ids = ingest_transfers(records, g.api_user_id)
+    if transfer_ids:
+        seqs = record_changes('new_transfer', transfer_ids)
+        db.session.commit()
+        _publish_bulk('new_transfer', transfer_ids, seqs)
+    return jsonify({'created': len(transfer_ids), 'failed': len(results) - len(transfer_ids), 'results': results})
 
 
 @transfer.route('/transfers/add', methods=['GET', 'POST'])
@@ -169,24 +320,18 @@ def add_transfer():
             user_id=current_user.id
         )
         db.session.add(transfer)
-        # Dynamically determine the number of items added
-        items = [key for key in request.form.keys() if key.startswith('items-') and key.endswith('-item')]
-        for item_field in items:
-            index = item_field.split('-')[1]
-            item_id = request.form.get(f'items-{index}-item')
-            quantity = request.form.get(f'items-{index}-quantity', type=int)
-            if item_id:
-                item = Item.query.get(item_id)
-                if item and quantity:
-                    transfer_item = TransferItem(
-                        transfer_id=transfer.id,
-                        item_id=item.id,
-                        quantity=quantity
-                    )
-                    db.session.add(transfer_item)
+        db.session.flush()  # Assigns transfer.id for the lines below
+
+        lines = _submitted_lines(request.form)
+        if lines:
+            db.session.execute(insert(TransferItem), [
+                {'transfer_id': transfer.id, 'item_id': item_id, 'quantity': quantity}
+                for item_id, quantity in lines.items()
+            ])
+        change = record_change('new_transfer', transfer)
         db.session.commit()
 
-        socketio.emit('new_transfer', {'message': 'New transfer added'})
+        notifier.publish(change, transfer_payload(transfer))
 
         flash('Transfer added successfully!', 'success')
         return redirect(url_for('transfer.view_transfers'))
@@ -203,35 +348,53 @@ def edit_transfer(transfer_id):
     form = TransferForm(obj=transfer)
 
     if form.validate_on_submit():
+        previous_location_ids = (transfer.from_location_id, transfer.to_location_id)
+        existing = db.session.execute(select(TransferItem.id, TransferItem.item_id, TransferItem.quantity)
+                                      .where(TransferItem.transfer_id == transfer.id)).all()
+        if transfer.completed:
+            before = ledger.movements_for(transfer, [(item_id, quantity) for _, item_id, quantity in existing])
+
         transfer.from_location_id = form.from_location_id.data
         transfer.to_location_id = form.to_location_id.data
 
-        # Clear existing TransferItem entries
-        TransferItem.query.filter_by(transfer_id=transfer.id).delete()
-
-        # Dynamically determine the number of items added, similar to the "add" route
-        items = [key for key in request.form.keys() if key.startswith('items-') and key.endswith('-item')]
-        for item_field in items:
-            index = item_field.split('-')[1]
-            item_id = request.form.get(f'items-{index}-item')
-            quantity = request.form.get(f'items-{index}-quantity', type=int)
-            if item_id and quantity:  # Ensure both are provided and valid
-                new_transfer_item = TransferItem(
-                    transfer_id=transfer.id,
-                    item_id=int(item_id),
-                    quantity=quantity
-                )
-                db.session.add(new_transfer_item)
-
+        # Only write the lines that actually changed
+        lines = _submitted_lines(request.form)
+        current = {}
+        removed = []
+        for line_id, item_id, quantity in existing:
+            if item_id in current or item_id not in lines:
+                removed.append(line_id)  # Dropped lines, and duplicates of an item collapse into one line
+            else:
+                current[item_id] = (line_id, quantity)
+        changed = [{'id': line_id, 'quantity': lines[item_id]}
+                   for item_id, (line_id, quantity) in current.items() if quantity != lines[item_id]]
+        added = [{'transfer_id': transfer.id, 'item_id': item_id, 'quantity': quantity}
+                 for item_id, quantity in lines.items() if item_id not in current]
+
+        if removed:
+            db.session.execute(delete(TransferItem).where(TransferItem.id.in_(removed))
+                               .execution_options(synchronize_session=False))
+        if changed:
+            db.session.execute(update(TransferItem), changed)
+        if added:
+            db.session.execute(insert(TransferItem), added)
+
+        if transfer.completed:
+            ledger.apply_transfer_edit(before, transfer, lines.items())
+        change = record_change('transfer_updated', transfer)
         db.session.commit()
+        notifier.publish(change, transfer_payload(transfer), previous_location_ids)
         flash('Transfer updated successfully!', 'success')
         return redirect(url_for('transfer.view_transfers'))
     elif form.errors:
         flash('There was an error submitting the transfer.', 'error')
 
     # For GET requests or if the form doesn't validate, pass existing items to the template
-    items = [{"id": item.item_id, "name": item.item.name, "quantity": item.quantity} for item in
-             transfer.transfer_items]
+    lines = db.session.execute(select(TransferItem.item_id, Item.name, TransferItem.quantity)
+                               .join(Item, TransferItem.item_id == Item.id)
+                               .where(TransferItem.transfer_id == transfer.id)
+                               .order_by(TransferItem.id)).all()
+    items = [{"id": item_id, "name": name, "quantity": quantity} for item_id, name, quantity in lines]
     return render_template('transfers/edit_transfer.html', form=form, transfer=transfer, items=items)
 
 
@@ -239,8 +402,13 @@ def edit_transfer(transfer_id):
 @login_required
 def delete_transfer(transfer_id):
     transfer = Transfer.query.get_or_404(transfer_id)
+    if transfer.completed:
+        ledger.apply_transfer(transfer, -1)
+    payload = transfer_payload(transfer)
+    change = record_change('transfer_deleted', transfer)
     db.session.delete(transfer)
     db.session.commit()
+    notifier.publish(change, payload)
     flash('Transfer deleted successfully!', 'success')
     return redirect(url_for('transfer.view_transfers'))
 
@@ -248,9 +416,9 @@ def delete_transfer(transfer_id):
 @transfer.route('/transfers/complete/<int:transfer_id>', methods=['GET'])
 @login_required
 def complete_transfer(transfer_id):
-    transfer = Transfer.query.get_or_404(transfer_id)
-    transfer.completed = True
-    db.session.commit()
+    Transfer.query.get_or_404(transfer_id)
+    # Same conditional update as the bulk path, so concurrent clicks count the transfer once
+    _set_completed([transfer_id], True)
     flash('Transfer marked as complete!', 'success')
     return redirect(url_for('transfer.view_transfers'))
 
@@ -258,27 +426,127 @@ def complete_transfer(transfer_id):
 @transfer.route('/transfers/uncomplete/<int:transfer_id>', methods=['GET'])
 @login_required
 def uncomplete_transfer(transfer_id):
-    transfer = Transfer.query.get_or_404(transfer_id)
-    transfer.completed = False
-    db.session.commit()
+    Transfer.query.get_or_404(transfer_id)
+    _set_completed([transfer_id], False)
     flash('Transfer marked as not completed.', 'success')
     return redirect(url_for('transfer.view_transfers'))
 
 
+def _selected_transfer_ids():
+    """Return the checked transfer ids, or None after flashing why there is nothing to do."""
+    transfer_ids = sorted({int(transfer_id) for transfer_id in request.form.getlist('transfer_ids')
+                           if transfer_id.isdigit()})
+    if not transfer_ids:
+        flash('No transfers selected.', 'warning')
+        return None
+    if len(transfer_ids) > MAX_BULK_TRANSFERS:
+        flash(f'Select at most {MAX_BULK_TRANSFERS} transfers at a time.', 'warning')
+        return None
+    return transfer_ids
+
+
+def _publish_bulk(event, transfer_ids, seqs, payloads=None):
+    if payloads is None:
+        payloads = {transfer.id: transfer_payload(transfer) for transfer in db.session.scalars(
+            select(Transfer).options(joinedload(Transfer.from_location), joinedload(Transfer.to_location))
+            .where(Transfer.id.in_(transfer_ids)))}
+    notifier.publish_many(event, [(seq, payloads[transfer_id]) for transfer_id, seq in zip(transfer_ids, seqs)
+                                  if transfer_id in payloads])
+
+
+def _set_completed(transfer_ids, completed):
+    # Only transfers whose state actually flips are returned, so repeating the request changes nothing
+    changed = db.session.execute(
+        update(Transfer).where(Transfer.id.in_(transfer_ids), Transfer.completed != completed)
+        .values(completed=completed)
+        .returning(Transfer.id, Transfer.from_location_id, Transfer.to_location_id, Transfer.date_created)
+        .execution_options(synchronize_session=False)).all()
+    if not changed:
+        db.session.rollback()
+        return []
+
+    event = 'transfer_completed' if completed else 'transfer_uncompleted'
+    changed_ids = [row.id for row in changed]
+    ledger.apply_movements(ledger.movements_for_transfers(changed), 1 if completed else -1)
+    seqs = record_changes(event, changed_ids)
+    db.session.commit()
+    _publish_bulk(event, changed_ids, seqs)
+    return changed_ids
+
+
+@transfer.route('/transfers/bulk_complete', methods=['POST'])
+@login_required
+def bulk_complete_transfers():
+    transfer_ids = _selected_transfer_ids()
+    if transfer_ids:
+        changed = _set_completed(transfer_ids, True)
+        flash(f'{len(changed)} transfers marked as complete.', 'success')
+    return redirect(url_for('transfer.view_transfers'))
+
+
+@transfer.route('/transfers/bulk_uncomplete', methods=['POST'])
+@login_required
+def bulk_uncomplete_transfers():
+    transfer_ids = _selected_transfer_ids()
+    if transfer_ids:
+        changed = _set_completed(transfer_ids, False)
+        flash(f'{len(changed)} transfers marked as not completed.', 'success')
+    return redirect(url_for('transfer.view_transfers'))
+
+
+@transfer.route('/transfers/bulk_delete', methods=['POST'])
+@login_required
+def bulk_delete_transfers():
+    transfer_ids = _selected_transfer_ids()
+    if not transfer_ids:
+        return redirect(url_for('transfer.view_transfers'))
+
+    payloads = {transfer.id: transfer_payload(transfer) for transfer in db.session.scalars(
+        select(Transfer).options(joinedload(Transfer.from_location), joinedload(Transfer.to_location))
+        .where(Transfer.id.in_(transfer_ids)))}
+    # Lines first, returning what completed transfers must take back out of stock and rollups
+    lines = db.session.execute(
+        delete(TransferItem).where(TransferItem.transfer_id.in_(transfer_ids))
+        .returning(TransferItem.transfer_id, TransferItem.item_id, TransferItem.quantity)
+        .execution_options(synchronize_session=False)).all()
+    deleted = db.session.execute(
+        delete(Transfer).where(Transfer.id.in_(transfer_ids))
+        .returning(Transfer.id, Transfer.from_location_id, Transfer.to_location_id, Transfer.date_created,
+                   Transfer.completed)
+        .execution_options(synchronize_session=False)).all()
+    completed = [row[:4] for row in deleted if row.completed]
+    if completed:
+        ledger.apply_movements(ledger.movements_for_transfers(completed, lines), -1)
+    deleted_ids = [row.id for row in deleted]
+    if deleted_ids:
+        seqs = record_changes('transfer_deleted', deleted_ids)
+        db.session.commit()
+        _publish_bulk('transfer_deleted', deleted_ids, seqs, payloads)
+
+    flash(f'{len(deleted_ids)} transfers deleted.', 'success')
+    return redirect(url_for('transfer.view_transfers'))
+
+
 @transfer.route('/transfers/view/<int:transfer_id>', methods=['GET'])
 @login_required
+@response_cache.cached('transfer', 'transfer_item', 'archived_transfer', 'archived_transfer_item', 'item', 'location',
+                       'user')
 def view_transfer(transfer_id):
-    transfer = Transfer.query.get_or_404(transfer_id)
-    transfer_items = TransferItem.query.filter_by(transfer_id=transfer.id).all()
+    transfer, lines = db.session.get(Transfer, transfer_id), TransferItem
+    if transfer is None:
+        transfer, lines = db.get_or_404(ArchivedTransfer, transfer_id), ArchivedTransferItem
+    transfer_items = lines.query.options(joinedload(lines.item)).filter_by(transfer_id=transfer.id).all()
     return render_template('transfers/view_transfer.html', transfer=transfer, transfer_items=transfer_items)
 
 
 @item.route('/items/search', methods=['GET'])
 @login_required
+@response_cache.cached('item', per_user=False)
 def search_items():
     search_term = request.args.get('term', '')
-    items = Item.query.filter(Item.name.ilike(f'%{search_term}%')).all()
-    items_data = [{'id': item.id, 'name': item.name} for item in items]  # Create a list of dicts
+    limit = current_app.config['ITEM_SEARCH_LIMIT']
+    limit = min(request.args.get('limit', limit, type=int), limit)
+    items_data = [{'id': item_id, 'name': name} for item_id, name in find_items(search_term, limit)]
     return jsonify(items_data)
 
 
@@ -287,89 +555,140 @@ def search_items():
 def import_items():
     form = ImportItemsForm()
     if form.validate_on_submit():
-        from run import app
-
         file = form.file.data
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-
-        # Parse the file
-        with open(filepath, 'r') as file:
-            for line in file:
-                item_name = line.strip()
-                if item_name:
-                    # Check if item already exists to avoid duplicates
-                    existing_item = Item.query.filter_by(name=item_name).first()
-                    if not existing_item:
-                        # Create a new item instance and add it to the database
-                        new_item = Item(name=item_name)
-                        db.session.add(new_item)
-            db.session.commit()
-
-        flash('Items imported successfully.', 'success')
-        return redirect(url_for('item.import_items'))
+        import_job = job_runner.submit('import_items', current_user.id, {'filename': file.filename or ''},
+                                       upload=file)
+        flash('Item import started.', 'success')
+        return redirect(url_for('job.view_job', job_id=import_job.id))
 
     return render_template('items/import_items.html', form=form)
 
 
 @transfer.route('/transfers/generate_report', methods=['GET', 'POST'])
+@login_required
 def generate_report():
     form = DateRangeForm()
     if form.validate_on_submit():
         start_datetime = form.start_datetime.data
         end_datetime = form.end_datetime.data
 
-        # Alias for "from" and "to" locations
-        from_location = db.aliased(Location)
-        to_location = db.aliased(Location)
-
-        aggregated_transfers = db.session.query(
-            from_location.name.label('from_location_name'),
-            to_location.name.label('to_location_name'),
-            Item.name.label('item_name'),
-            func.sum(TransferItem.quantity).label('total_quantity')
-        ).select_from(Transfer) \
-            .join(TransferItem, Transfer.id == TransferItem.transfer_id) \
-            .join(Item, TransferItem.item_id == Item.id) \
-            .join(from_location, Transfer.from_location_id == from_location.id) \
-            .join(to_location, Transfer.to_location_id == to_location.id) \
-            .filter(
-            Transfer.completed == True,
-            Transfer.date_created >= start_datetime,
-            Transfer.date_created <= end_datetime
-        ) \
-            .group_by(
-            from_location.name,
-            to_location.name,
-            Item.name
-        ) \
-            .order_by(
-            from_location.name,
-            to_location.name,
-            Item.name
-        ) \
-            .all()
-
-        # Process the results for display or session storage
-        session['aggregated_transfers'] = [{
-            'from_location_name': result[0],
-            'to_location_name': result[1],
-            'item_name': result[2],
-            'total_quantity': result[3]
-        } for result in aggregated_transfers]
-
-        # Store start and end date/time in session for use in the report
-        session['report_start_datetime'] = start_datetime.strftime('%Y-%m-%d %H:%M')
-        session['report_end_datetime'] = end_datetime.strftime('%Y-%m-%d %H:%M')
+        # Identical reports over unchanged data share an id and are served from the cache
+        report_id = report_cache.key(start_datetime, end_datetime,
+                                     current_versions('transfer', 'transfer_item', 'item', 'location'))
+        if report_cache.get(report_id) is None:
+            report_job = job_runner.submit('report', current_user.id, {
+                'start': start_datetime.isoformat(), 'end': end_datetime.isoformat(), 'report_id': report_id})
+            return redirect(url_for('job.view_job', job_id=report_job.id))
 
         flash('Transfer report generated successfully.', 'success')
-        return redirect(url_for('transfer.view_report'))
+        return redirect(url_for('transfer.view_report', report_id=report_id))
 
     return render_template('transfers/generate_report.html', form=form)
 
 
-@transfer.route('/transfers/report')
-def view_report():
-    aggregated_transfers = session.get('aggregated_transfers', [])
-    return render_template('transfers/view_report.html', aggregated_transfers=aggregated_transfers)
+@transfer.route('/transfers/report/<report_id>')
+@login_required
+def view_report(report_id):
+    report = report_cache.get(report_id)
+    if report is None:
+        flash('That report has expired, please generate it again.', 'warning')
+        return redirect(url_for('transfer.generate_report'))
+    return render_template('transfers/view_report.html', report=report, report_id=report_id,
+                           aggregated_transfers=report['aggregated_transfers'])
+
+
+def _export_response(header, rows, filename, export_format):
+    if export_format == 'xlsx':
+        output = xlsx_file(header, rows, filename)
+        if output is None:
+            return None
+        return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=f'{filename}.xlsx')
+
+    # Rows are encoded and sent as they are read, so large exports start downloading immediately
+    return Response(stream_with_context(csv_chunks(header, rows)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+
+
+@transfer.route('/transfers/report/<report_id>/export')
+@login_required
+def export_report(report_id):
+    report = report_cache.get(report_id)
+    if report is None:
+        flash('That report has expired, please generate it again.', 'warning')
+        return redirect(url_for('transfer.generate_report'))
+
+    response = _export_response(REPORT_HEADER, report_rows(report['aggregated_transfers']), 'transfer_report',
+                                request.args.get('format', 'csv'))
+    if response is None:
+        flash('XLSX export requires openpyxl to be installed.', 'warning')
+        return redirect(url_for('transfer.view_report', report_id=report_id))
+    return response
+
+
+def _export_params(args):
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else None
+        end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        abort(400)
+    return args.get('filter', 'all'), start, end
+
+
+@transfer.route('/transfers/export')
+@login_required
+def export_transfers():
+    filter_option, start, end = _export_params(request.args)
+    rows = transfer_line_rows(filter_option, start, end)
+    response = _export_response(TRANSFER_LINE_HEADER, rows, 'transfers', request.args.get('format', 'csv'))
+    if response is None:
+        flash('XLSX export requires openpyxl to be installed.', 'warning')
+        return redirect(url_for('transfer.view_transfers'))
+    return response
+
+
+@transfer.route('/transfers/export', methods=['POST'])
+@login_required
+def queue_export_transfers():
+    # Same export as above, written to a file by a background job for large ranges
+    form = TransferActionForm()
+    if not form.validate_on_submit():
+        abort(400)
+    filter_option, start, end = _export_params(request.form)
+    export_job = job_runner.submit('export_transfers', current_user.id, {
+        'filter': filter_option,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'format': 'xlsx' if request.form.get('format') == 'xlsx' else 'csv'
+    })
+    return redirect(url_for('job.view_job', job_id=export_job.id))
+
+
+def _owned_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        abort(404)
+    return job
+
+
+@job.route('/jobs/<job_id>')
+@login_required
+def view_job(job_id):
+    return render_template('jobs/view_job.html', job=job_payload(_owned_job(job_id)), finished=FINISHED)
+
+
+@job.route('/api/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    return jsonify(job_payload(_owned_job(job_id)))
+
+
+@job.route('/jobs/<job_id>/download')
+@login_required
+def download_job_output(job_id):
+    owned = _owned_job(job_id)
+    if owned.kind != 'export_transfers' or owned.status != DONE:
+        abort(404)
+    filename = job_payload(owned)['result']['filename']
+    mimetype = XLSX_MIMETYPE if filename.endswith('.xlsx') else 'text/csv'
+    return send_file(job_runner.path(owned.id, '.output'), mimetype=mimetype, as_attachment=True,
+                     download_name=filename)
@@ -0,0 +1,246 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+from app import db
+from app.models import Item
+from app.versioning import current_versions
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ItemSearchIndex:
+    """In-process index over item names answering autocomplete lookups without a table scan.
+
+    Names are kept in a sorted list for prefix lookups, a sorted list of their inner
+    words for word-prefix lookups, and trigram posting lists for substring lookups. The
+    index is as of ``version`` of the item table, or None when it needs reloading; until
+    the reload it keeps answering from what it has. Reloads are built outside the lock,
+    one at a time, and swapped in whole.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._version = None
+        self._built = False
+        self._names = {}
+        self._prefixes = []
+        self._words = []
+        self._postings = defaultdict(set)
+
+    @property
+    def version(self):
+        return self._version
+
+    def load(self, rows, version):
+        names, postings = {}, defaultdict(set)
+        prefixes, words = [], []
+        for item_id, name in rows:
+            lowered = name.lower()
+            names[item_id] = name
+            prefixes.append((lowered, item_id))
+            words.extend((word, item_id) for word in lowered.split()[1:])
+            for trigram in _trigrams(lowered):
+                postings[trigram].add(item_id)
+        prefixes.sort()
+        words.sort()
+        with self._lock:
+            self._names, self._prefixes, self._words, self._postings = names, prefixes, words, postings
+            self._version = version
+            self._built = True
+
+    def refresh(self, version, read_rows):
+        """Reload from ``read_rows()`` as of ``version``, unless the index is that recent already.
+
+        Only one caller reloads at a time. The others keep searching the current index, and
+        only wait when there is none yet.
+        """
+        if not self._reload_lock.acquire(blocking=not self._built):
+            return
+        try:
+            if self._version is None or self._version < version:
+                self.load(read_rows(), version)
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def apply(self, changes, version):
+        """Apply the ``(operation, id, name)`` changes of the commit that moved the item table to ``version``."""
+        with self._lock:
+            for operation, item_id, name in changes:
+                if operation == 'add':
+                    self.add(item_id, name)
+                else:
+                    self.remove(item_id)
+            # Versions go up by one per commit, so anything else means another commit came in between
+            if self._version is not None and self._version == version - 1:
+                self._version = version
+            else:
+                self._version = None
+
+    def add(self, item_id, name):
+        with self._lock:
+            if not self._built:
+                return
+            self.remove(item_id)
+            lowered = name.lower()
+            self._names[item_id] = name
+            bisect.insort(self._prefixes, (lowered, item_id))
+            for word in lowered.split()[1:]:
+                bisect.insort(self._words, (word, item_id))
+            for trigram in _trigrams(lowered):
+                self._postings[trigram].add(item_id)
+
+    def remove(self, item_id):
+        with self._lock:
+            if not self._built:
+                return
+            name = self._names.pop(item_id, None)
+            if name is None:
+                return
+            lowered = name.lower()
+            self._discard(self._prefixes, (lowered, item_id))
+            for word in lowered.split()[1:]:
+                self._discard(self._words, (word, item_id))
+            for trigram in _trigrams(lowered):
+                postings = self._postings.get(trigram)
+                if postings is not None:
+                    postings.discard(item_id)
+                    if not postings:
+                        del self._postings[trigram]
+
+    @staticmethod
+    def _discard(entries, entry):
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    @staticmethod
+    def _scan_prefix(entries, term):
+        position = bisect.bisect_left(entries, (term,))
+        while position < len(entries) and entries[position][0].startswith(term):
+            yield entries[position]
+            position += 1
+
+    def search(self, term, limit):
+        """Return up to ``limit`` ``(id, name)`` pairs ranked exact, prefix, word prefix, substring."""
+        term = term.strip().lower()
+        if not term or limit <= 0:
+            return []
+
+        with self._lock:
+            results = []
+            seen = set()
+
+            def collect(item_id):
+                if item_id not in seen:
+                    seen.add(item_id)
+                    results.append((item_id, self._names[item_id]))
+                return len(results) >= limit
+
+            # Whole-name prefixes come out alphabetically, so an exact match is always first
+            for _, item_id in self._scan_prefix(self._prefixes, term):
+                if collect(item_id):
+                    return results
+            for _, item_id in self._scan_prefix(self._words, term):
+                if collect(item_id):
+                    return results
+
+            if len(term) < 3:
+                return results
+
+            # Intersect the posting lists smallest first, then confirm the substring
+            postings = sorted((self._postings.get(trigram, set()) for trigram in _trigrams(term)), key=len)
+            candidates = set(postings[0]).difference(seen)
+            for other in postings[1:]:
+                candidates &= other
+                if not candidates:
+                    return results
+            matches = ((self._names[item_id].lower(), item_id) for item_id in candidates
+                       if term in self._names[item_id].lower())
+            for _, item_id in heapq.nsmallest(limit - len(results), matches):
+                collect(item_id)
+            return results
+
+
+item_search_index = ItemSearchIndex()
+
+
+def find_items(term, limit):
+    # Every commit that writes items bumps the version, in any worker process, so an index
+    # missing changes made elsewhere is reloaded on its next use
+    (version,) = current_versions('item')
+    if item_search_index.version != version:
+        item_search_index.refresh(version, lambda: db.session.execute(select(Item.id, Item.name)).all())
+    return item_search_index.search(term, limit)
+
+
+def execute_item_statement(statement, operation, parameters=None):
+    """Run a bulk INSERT (``operation`` 'add') or DELETE ('remove') on items and stage the rows it wrote.
+
+    Bulk statements skip the mapper events, so a commit containing any other bulk item
+    statement reloads the index. Returns the ``(id, name)`` rows.
+    """
+    rows = db.session.execute(statement.returning(Item.id, Item.name)
+                              .execution_options(item_search_staged=True), parameters).all()
+    db.session.info.setdefault('item_search_changes', []).extend((operation, item_id, name) for item_id, name in rows)
+    return rows
+
+
+# Item changes are staged on the session and only reach the index once they commit
+def _stage(target, operation):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('item_search_changes', []).append((operation, target.id, target.name))
+
+
+@event.listens_for(Item, 'after_insert')
+def _item_inserted(mapper, connection, target):
+    _stage(target, 'add')
+
+
+@event.listens_for(Item, 'after_update')
+def _item_updated(mapper, connection, target):
+    _stage(target, 'add')
+
+
+@event.listens_for(Item, 'after_delete')
+def _item_deleted(mapper, connection, target):
+    _stage(target, 'remove')
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _item_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name == Item.__tablename__ and \
+                not orm_execute_state.execution_options.get('item_search_staged'):
+            orm_execute_state.session.info['item_search_bulk'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_item_changes(session):
+    changes = session.info.pop('item_search_changes', [])
+    bulk = session.info.pop('item_search_bulk', False)
+    version = session.info.get('committed_versions', {}).get(Item.__tablename__)
+    if version is None:
+        return
+    if bulk:
+        item_search_index.invalidate()
+    else:
+        item_search_index.apply(changes, version)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_item_changes(session, previous_transaction):
+    session.info.pop('item_search_changes', None)
+    session.info.pop('item_search_bulk', None)
@@ -0,0 +1,113 @@
+import itertools
+import random
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.ledger import rebuild_stock
+from app.models import Item, Location, Transfer, TransferItem, User
+from app.rollups import rebuild_rollups
+
+ADJECTIVES = ['Red', 'Blue', 'Green', 'Large', 'Small', 'Frozen', 'Fresh', 'Organic', 'Spicy', 'Sweet',
+              'Dark', 'Light', 'Premium', 'Classic', 'Diet', 'Whole', 'Sliced', 'Smoked', 'Roasted', 'Salted']
+NOUNS = ['Cola', 'Burger', 'Bun', 'Napkin', 'Cup', 'Lid', 'Straw', 'Fries', 'Sauce', 'Cheese', 'Onion',
+         'Tomato', 'Lettuce', 'Pickle', 'Chicken', 'Beef', 'Coffee', 'Tea', 'Syrup', 'Water', 'Juice',
+         'Pretzel', 'Hotdog', 'Nacho', 'Popcorn', 'Candy', 'Glove', 'Towel', 'Bag', 'Tray']
+SIZES = ['Small', 'Medium', 'Large', '500ml', '1L', '2L', '12oz', '16oz', '24pk', 'Case']
+LOCATION_KINDS = ['Warehouse', 'Kitchen', 'Bar', 'Stand', 'Suite Level', 'Concourse', 'Commissary', 'Club']
+
+# Transfers cluster around service hours rather than spreading evenly over the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 6, 8, 9, 10, 12, 12, 11, 10, 10, 12, 14, 14, 12, 9, 6, 3, 2]
+
+
+def item_name(rng, number):
+    return f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(SIZES)} #{number}'
+
+
+def _zipf_weights(count, exponent=1.1):
+    # A few popular items and hub locations account for most of the movement, as in production
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def _last_number(column, like, pattern):
+    # Numbered from the largest number in use rather than the row count, which deletes shrink
+    numbers = (re.search(pattern, value) for value in db.session.scalars(select(column).where(column.like(like))))
+    return max((int(match.group(1)) for match in numbers if match), default=0)
+
+
+def _insert_returning_ids(model, rows):
+    return list(db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+
+def seed(locations=20, items=2000, users=10, transfers=10000, lines_per_transfer=8, days=365,
+         completed_ratio=0.8, password='password', seed_value=None, batch_size=2000, progress=None):
+    """Generate synthetic locations, items, users and transfers into the configured database.
+
+    Existing rows are kept; generated names are numbered after the largest number already
+    used so the command can be run repeatedly. Stock balances and rollups are rebuilt at the end.
+    """
+    rng = random.Random(seed_value)
+    location_offset = _last_number(Location.name, '% %', r' (\d+)$')
+    item_offset = _last_number(Item.name, '%#%', r'#(\d+)$')
+    user_offset = _last_number(User.email, 'user%@example.com', r'^user(\d+)@example\.com$')
+
+    location_ids = _insert_returning_ids(Location, [
+        {'name': f'{rng.choice(LOCATION_KINDS)} {location_offset + number}'} for number in range(1, locations + 1)])
+    item_ids = []
+    for start in range(0, items, batch_size):
+        item_ids += _insert_returning_ids(Item, [
+            {'name': item_name(rng, item_offset + number)}
+            for number in range(start + 1, min(start + batch_size, items) + 1)])
+    password_hash = generate_password_hash(password)
+    user_ids = _insert_returning_ids(User, [
+        {'email': f'user{user_offset + number}@example.com', 'password': password_hash, 'is_admin': False,
+         'active': True} for number in range(1, users + 1)])
+    db.session.commit()
+
+    location_ids = location_ids or list(db.session.scalars(select(Location.id)))
+    item_ids = item_ids or list(db.session.scalars(select(Item.id)))
+    user_ids = user_ids or list(db.session.scalars(select(User.id)))
+    if transfers and (len(location_ids) < 2 or not item_ids or not user_ids):
+        raise ValueError('Transfers need at least two locations, one item and one user.')
+
+    location_weights = _zipf_weights(len(location_ids))
+    item_weights = _zipf_weights(len(item_ids))
+    rng.shuffle(item_ids)
+    now = datetime.utcnow().replace(microsecond=0)
+    created = 0
+    while created < transfers:
+        count = min(batch_size, transfers - created)
+        rows = []
+        for _ in range(count):
+            from_id, to_id = rng.choices(location_ids, cum_weights=location_weights, k=2)
+            while to_id == from_id:
+                to_id = rng.choice(location_ids)
+            day = now - timedelta(days=rng.randrange(days))
+            hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+            rows.append({
+                'from_location_id': from_id,
+                'to_location_id': to_id,
+                'user_id': rng.choice(user_ids),
+                'date_created': day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60)),
+                'completed': rng.random() < completed_ratio
+            })
+        transfer_ids = _insert_returning_ids(Transfer, rows)
+
+        lines = []
+        for transfer_id in transfer_ids:
+            line_count = min(len(item_ids), max(1, int(rng.expovariate(1 / lines_per_transfer))))
+            for item_id in set(rng.choices(item_ids, cum_weights=item_weights, k=line_count)):
+                lines.append({'transfer_id': transfer_id, 'item_id': item_id,
+                              'quantity': max(1, int(rng.paretovariate(1.5) * 4))})
+        db.session.execute(insert(TransferItem), lines)
+        db.session.commit()
+        created += count
+        if progress:
+            progress(created)
+
+    rebuild_stock()
+    rebuild_rollups()
+    return {'locations': len(location_ids), 'items': len(item_ids), 'users': len(user_ids), 'transfers': created}
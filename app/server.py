@@ -0,0 +1,95 @@
+import argparse
+import importlib.util
+import os
+import signal
+import subprocess
+import sys
+
+# Socket.IO async mode -> gunicorn worker class serving it
+WORKER_CLASSES = {'threading': 'gthread', 'gevent': 'gevent', 'eventlet': 'eventlet'}
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='serve', description='Run AssetFlow under a production server.')
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', 1)),
+                        help='server processes, listening on consecutive ports from --port')
+    parser.add_argument('--mode', choices=['auto', *WORKER_CLASSES], default=os.getenv('SERVER_MODE', 'auto'),
+                        help='threads, or green threads with gevent or eventlet')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 32)),
+                        help='request threads per process in threading mode')
+    parser.add_argument('--connections', type=int, default=int(os.getenv('WEB_CONNECTIONS', 1000)),
+                        help='simultaneous connections per process in gevent and eventlet modes')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.getenv('GRACEFUL_TIMEOUT', 30)),
+                        help='seconds requests in flight get to finish on shutdown')
+    parser.add_argument('--skip-init-db', action='store_true',
+                        help='do not create or upgrade the schema before starting')
+    return parser.parse_args(argv)
+
+
+def resolve_mode(mode):
+    if mode != 'auto':
+        return mode
+    for candidate in ('gevent', 'eventlet'):
+        if importlib.util.find_spec(candidate) is not None:
+            return candidate
+    return 'threading'
+
+
+def gunicorn_command(options, mode, port):
+    # One process per port: Socket.IO long-polling needs every request of a session on the same process
+    command = [sys.executable, '-m', 'gunicorn', 'run:app', '--chdir', PROJECT_ROOT, '--workers', '1',
+               '--worker-class', WORKER_CLASSES[mode], '--bind', f'{options.host}:{port}',
+               '--graceful-timeout', str(options.graceful_timeout), '--access-logfile', '-']
+    if mode == 'threading':
+        command += ['--threads', str(options.threads)]
+    else:
+        command += ['--worker-connections', str(options.connections)]
+    return command
+
+
+def init_db(env):
+    # Once here instead of in every worker process as it boots
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'run.py', 'init-db'], cwd=PROJECT_ROOT, env=env)
+    if result.returncode:
+        raise SystemExit('Database initialisation failed; not starting the server.')
+
+
+def serve(options):
+    """Run the app under gunicorn and return its exit status once every process has stopped.
+
+    Each process loads run.py itself, after gevent or eventlet have patched the standard
+    library. With several workers, put them behind a proxy with sticky sessions and set
+    SOCKETIO_MESSAGE_QUEUE so events reach clients on every process.
+    """
+    if importlib.util.find_spec('gunicorn') is None:
+        raise SystemExit('The serve command needs gunicorn: pip install gunicorn')
+    if options.workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        raise SystemExit('Several workers need SOCKETIO_MESSAGE_QUEUE so events reach every process.')
+
+    mode = resolve_mode(options.mode)
+    env = dict(os.environ, SOCKETIO_ASYNC_MODE=mode, INIT_DB_ON_STARTUP='0')
+    if not options.skip_init_db:
+        init_db(env)
+    commands = [gunicorn_command(options, mode, options.port + index) for index in range(options.workers)]
+    if len(commands) == 1:
+        # Replace this process so signals from the supervisor reach gunicorn directly
+        os.execve(sys.executable, commands[0], env)
+
+    processes = [subprocess.Popen(command, env=env) for command in commands]
+
+    def stop(signum, frame):
+        # gunicorn stops gracefully on SIGTERM, letting requests in flight finish
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return max(process.wait() for process in processes)
+
+
+def main(argv):
+    return serve(parse_args(argv))
@@ -0,0 +1,33 @@
+from flask_login import current_user
+from flask_socketio import join_room, leave_room
+
+from app.jobs import user_room
+from app.notifications import ALL_TRANSFERS_ROOM, location_room
+
+
+def _rooms(data):
+    data = data or {}
+    rooms = {location_room(int(location_id)) for location_id in data.get('locations', [])
+             if str(location_id).isdigit()}
+    if data.get('all'):
+        rooms.add(ALL_TRANSFERS_ROOM)
+    return rooms
+
+
+def register_socket_handlers(socketio):
+    @socketio.on('connect')
+    def connect(auth=None):
+        # Refuse anonymous connections; transfer rooms are joined explicitly with "subscribe"
+        if not current_user.is_authenticated:
+            return False
+        join_room(user_room(current_user.id))  # Background job progress and completion
+
+    @socketio.on('subscribe')
+    def subscribe(data):
+        for room in _rooms(data):
+            join_room(room)
+
+    @socketio.on('unsubscribe')
+    def unsubscribe(data):
+        for room in _rooms(data):
+            leave_room(room)
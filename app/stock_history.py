@@ -0,0 +1,74 @@
+from collections import Counter
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models import StockMovement, StockSnapshot, StockSnapshotLine
+
+
+def _filtered(statement, model, location_id, item_id):
+    if location_id is not None:
+        statement = statement.where(model.location_id == location_id)
+    if item_id is not None:
+        statement = statement.where(model.item_id == item_id)
+    return statement
+
+
+def _balances(snapshot, last_movement_id=None, until=None, location_id=None, item_id=None):
+    """Replay the movements logged after ``snapshot`` (None to start from nothing) onto its balances.
+
+    Only movements up to ``last_movement_id`` and recorded by ``until`` are replayed, when given.
+    Returns ``{(location_id, item_id): quantity}``.
+    """
+    balances = Counter()
+    if snapshot is not None:
+        lines = select(StockSnapshotLine.location_id, StockSnapshotLine.item_id, StockSnapshotLine.quantity) \
+            .where(StockSnapshotLine.snapshot_id == snapshot.id)
+        for location, item, quantity in db.session.execute(_filtered(lines, StockSnapshotLine, location_id, item_id)):
+            balances[(location, item)] += quantity
+
+    tail = select(StockMovement.location_id, StockMovement.item_id, func.sum(StockMovement.quantity)) \
+        .where(StockMovement.id > (snapshot.last_movement_id if snapshot is not None else 0)) \
+        .group_by(StockMovement.location_id, StockMovement.item_id)
+    if last_movement_id is not None:
+        tail = tail.where(StockMovement.id <= last_movement_id)
+    if until is not None:
+        tail = tail.where(StockMovement.recorded_at <= until)
+    for location, item, quantity in db.session.execute(_filtered(tail, StockMovement, location_id, item_id)):
+        balances[(location, item)] += quantity
+    return balances
+
+
+def take_snapshot():
+    """Store the balances after every movement logged so far, or return None if nothing moved since the last."""
+    previous = db.session.scalars(select(StockSnapshot).order_by(StockSnapshot.id.desc()).limit(1)).first()
+    last_movement_id = db.session.scalar(select(func.max(StockMovement.id))) or 0
+    if previous is not None and previous.last_movement_id == last_movement_id:
+        return None
+
+    # Built from the previous snapshot and the log rather than LocationStock, so it matches the log exactly
+    balances = _balances(previous, last_movement_id)
+    snapshot = StockSnapshot(last_movement_id=last_movement_id)
+    db.session.add(snapshot)
+    db.session.flush()
+    rows = [{'snapshot_id': snapshot.id, 'location_id': location_id, 'item_id': item_id, 'quantity': quantity}
+            for (location_id, item_id), quantity in balances.items() if quantity]
+    if rows:
+        db.session.execute(insert(StockSnapshotLine), rows)
+    db.session.commit()
+    return snapshot
+
+
+def stock_at(moment, location_id=None, item_id=None):
+    """Return ``(snapshot, balances)`` for the stock as it stood at ``moment``, optionally for one location or item.
+
+    Starts from the latest snapshot taken by then and replays only the movements logged since.
+    Returns None for moments before the first snapshot, where the history starts.
+    """
+    snapshot = db.session.scalars(select(StockSnapshot).where(StockSnapshot.taken_at <= moment)
+                                  .order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc())
+                                  .limit(1)).first()
+    if snapshot is None:
+        return None
+    balances = _balances(snapshot, until=moment, location_id=location_id, item_id=item_id)
+    return snapshot, {key: quantity for key, quantity in balances.items() if quantity}
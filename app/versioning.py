@@ -0,0 +1,73 @@
+from itertools import chain
+
+from sqlalchemy import event, insert, select, update
+
+from app import db
+from app.models import DataVersion
+
+VERSION_TABLE = DataVersion.__table__
+
+
+def current_versions(*names):
+    """Return the version stamps of the named tables, in the order given."""
+    versions = dict(db.session.execute(select(DataVersion.name, DataVersion.version)
+                                       .where(DataVersion.name.in_(names))).all())
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def ensure_versions():
+    """Create a version row for every table that does not have one yet."""
+    existing = set(db.session.execute(select(DataVersion.name)).scalars())
+    missing = [name for name in db.metadata.tables if name not in existing and name != VERSION_TABLE.name]
+    if missing:
+        db.session.execute(insert(DataVersion), [{'name': name, 'version': 0} for name in missing])
+        db.session.commit()
+
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_flushed_tables(session, flush_context):
+    changed = _changed_tables(session)
+    for instance in chain(session.new, session.deleted):
+        changed.add(instance.__table__.name)
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            changed.add(instance.__table__.name)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _record_statement_tables(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements never go through the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _changed_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _bump_versions(session):
+    session.info.pop('committed_versions', None)
+    session.flush()
+    changed = session.info.pop('changed_tables', set())
+    changed.discard(VERSION_TABLE.name)
+    if not changed:
+        return
+
+    # Written on the connection directly so the bump itself is not recorded as a change
+    connection = session.connection()
+    bumped = dict(connection.execute(update(VERSION_TABLE).where(VERSION_TABLE.c.name.in_(changed))
+                                     .values(version=VERSION_TABLE.c.version + 1)
+                                     .returning(VERSION_TABLE.c.name, VERSION_TABLE.c.version)).all())
+    missing = changed - set(bumped)
+    if missing:
+        connection.execute(insert(VERSION_TABLE), [{'name': name, 'version': 1} for name in missing])
+        bumped.update((name, 1) for name in missing)
+    # The versions this commit moves its tables to, for in-process caches that follow it
+    session.info['committed_versions'] = bumped
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changed_tables(session, previous_transaction):
+    session.info.pop('changed_tables', None)
+    session.info.pop('committed_versions', None)
@@ -0,0 +1,70 @@
+"""Transfers per second through the batch ingestion API of a running server.
+
+Create a token for a seeded user, start the server, then run from the repository root::
+
+    flask --app run.py create-api-token --email user1@example.com --name benchmark
+    python -m benchmarks.ingest_benchmark --url http://127.0.0.1:5000 --token <token> --batch-sizes 1 100 1000
+
+Each batch references random seeded locations and items by name, so every request pays for
+the set-based lookups as well as the inserts.
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+
+from app import create_app, db
+from app.models import Item, Location
+
+
+def reference_names():
+    app, _ = create_app([])
+    with app.app_context():
+        locations = [name for (name,) in db.session.query(Location.name)]
+        items = [name for (name,) in db.session.query(Item.name).limit(5000)]
+    if len(locations) < 2 or not items:
+        raise SystemExit('Seed the database first: flask --app run.py seed')
+    return locations, items
+
+
+def batch(size, locations, items, lines, completed):
+    return {'transfers': [{
+        'from_location': random.choice(locations),
+        'to_location': random.choice(locations),
+        'completed': random.random() < completed,
+        'items': [{'item': random.choice(items), 'quantity': random.randint(1, 20)} for _ in range(lines)]
+    } for _ in range(size)]}
+
+
+def post(url, token, body):
+    request = urllib.request.Request(url + '/api/transfers/batch', data=json.dumps(body).encode(), method='POST',
+                                     headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--transfers', type=int, default=5000, help='transfers sent per batch size')
+    parser.add_argument('--lines', type=int, default=5, help='lines per transfer')
+    parser.add_argument('--completed', type=float, default=0.5, help='fraction sent as completed')
+    args = parser.parse_args()
+
+    random.seed(1)
+    locations, items = reference_names()
+    print(f'{"batch size":>10} {"requests":>9} {"transfers/s":>12} {"ms/request":>11}')
+    for size in args.batch_sizes:
+        requests = max(1, args.transfers // size)
+        bodies = [batch(size, locations, items, args.lines, args.completed) for _ in range(requests)]
+        started = time.perf_counter()
+        created = sum(post(args.url, args.token, body)['created'] for body in bodies)
+        seconds = time.perf_counter() - started
+        print(f'{size:>10} {requests:>9} {created / seconds:>12.0f} {seconds / requests * 1000:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
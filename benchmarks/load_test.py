@@ -0,0 +1,207 @@
+"""Drive the busiest pages through the Flask test client and report throughput and latency.
+
+Seed the database first, then run from the repository root with the same environment::
+
+    flask --app run.py seed --transfers 100000 --seed 1
+    python -m benchmarks.load_test --email user1@example.com --password password --output run.json
+
+add_transfer and import_items write to the database, so point it at a disposable copy.
+Pass ``--baseline`` with an earlier ``--output`` file to print the change per scenario.
+"""
+import argparse
+import io
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import create_app, db
+from app.models import Item, Location
+from app.seed import item_name
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+JOB_PATH = re.compile(r'/jobs/([0-9a-f]{32})$')
+
+
+class Client:
+    """A test client logged in through the real login form."""
+
+    def __init__(self, app, email, password):
+        self.client = app.test_client()
+        login_page = self.client.get('/auth/login').get_data(as_text=True)
+        response = self.client.post('/auth/login', data={
+            'email': email, 'password': password, 'csrf_token': self._token(login_page)})
+        if response.status_code != 302 or response.location.endswith('/auth/login'):
+            raise SystemExit(f'Could not log in as {email}; is the user seeded and active?')
+        self.csrf_token = self._token(self.client.get('/transfers/add').get_data(as_text=True))
+
+    @staticmethod
+    def _token(page):
+        match = CSRF_PATTERN.search(page)
+        return match.group(1) if match else ''
+
+
+def wait_for_job(client, response):
+    # Imports and uncached reports run as background jobs; time them until they finish
+    match = JOB_PATH.search(response.location or '') if response.status_code == 302 else None
+    if match is None:
+        return response
+    while True:
+        status = client.client.get(f'/api/jobs/{match.group(1)}')
+        if status.status_code != 200 or status.get_json()['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.01)
+
+
+def view_transfers(client, rng, data):
+    return client.client.get('/transfers', query_string={'filter': rng.choice(['all', 'completed', 'not_completed'])})
+
+
+def search_items(client, rng, data):
+    name = rng.choice(data['item_names']).lower()
+    return client.client.get('/items/search', query_string={'term': name[:rng.randint(1, 6)]})
+
+
+def add_transfer(client, rng, data):
+    from_id, to_id = rng.sample(data['location_ids'], 2)
+    form = {'csrf_token': client.csrf_token, 'from_location_id': from_id, 'to_location_id': to_id}
+    for index, item_id in enumerate(rng.sample(data['item_ids'], min(len(data['item_ids']), rng.randint(1, 20)))):
+        form[f'items-{index}-item'] = item_id
+        form[f'items-{index}-quantity'] = rng.randint(1, 24)
+    return client.client.post('/transfers/add', data=form)
+
+
+def generate_report(client, rng, data):
+    end = datetime.utcnow() - timedelta(days=rng.randrange(365), minutes=rng.randrange(1440))
+    start = end - timedelta(days=rng.choice([1, 7, 30, 90, 365]), minutes=rng.randrange(1440))
+    response = client.client.post('/transfers/generate_report', data={
+        'csrf_token': client.csrf_token,
+        'start_datetime': start.strftime('%Y-%m-%d %H:%M'),
+        'end_datetime': end.strftime('%Y-%m-%d %H:%M')})
+    response = wait_for_job(client, response)
+    if response.status_code == 302:
+        response = client.client.get(response.location)
+    return response
+
+
+def import_items(client, rng, data):
+    # Half of the names already exist, so the import exercises both inserts and skips
+    names = [rng.choice(data['item_names']) if rng.random() < 0.5 else item_name(rng, rng.randrange(10 ** 9))
+             for _ in range(200)]
+    upload = io.BytesIO('\n'.join(names).encode())
+    return wait_for_job(client, client.client.post('/import_items', data={
+        'csrf_token': client.csrf_token, 'file': (upload, 'items.txt')}, content_type='multipart/form-data'))
+
+
+SCENARIOS = {
+    'view_transfers': view_transfers,
+    'search_items': search_items,
+    'add_transfer': add_transfer,
+    'generate_report': generate_report,
+    'import_items': import_items,
+}
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def summarise(latencies, errors, seconds):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / seconds if seconds else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_scenario(clients, scenario, requests, data, seed):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(client, count, worker_seed):
+        rng = random.Random(worker_seed)
+        for _ in range(count):
+            started = time.perf_counter()
+            response = scenario(client, rng, data)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors[0] += 1
+
+    shares = [requests // len(clients) + (1 if index < requests % len(clients) else 0) for index in range(len(clients))]
+    threads = [threading.Thread(target=worker, args=(client, share, seed + index))
+               for index, (client, share) in enumerate(zip(clients, shares))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarise(latencies, errors[0], time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='logged-in clients running in parallel')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON for later comparison')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    app, _ = create_app([])
+    with app.app_context():
+        data = {
+            'location_ids': list(db.session.scalars(select(Location.id))),
+            'item_ids': list(db.session.scalars(select(Item.id).limit(50000))),
+            'item_names': list(db.session.scalars(select(Item.name).limit(50000))),
+        }
+    if len(data['location_ids']) < 2 or not data['item_ids']:
+        raise SystemExit('Seed the database first: flask --app run.py seed')
+
+    results = {}
+    login_latencies = []
+    clients = []
+    for _ in range(args.concurrency):
+        started = time.perf_counter()
+        clients.append(Client(app, args.email, args.password))
+        login_latencies.append(time.perf_counter() - started)
+    results['login'] = summarise(login_latencies, 0, sum(login_latencies))
+
+    for name in args.scenarios:
+        results[name] = run_scenario(clients, SCENARIOS[name], args.requests, data, args.seed)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f'{"scenario":<16} {"reqs":>6} {"errors":>6} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}'
+          + (f' {"p50 change":>11}' if baseline else ''))
+    for name, result in results.items():
+        line = (f'{name:<16} {result["requests"]:>6} {result["errors"]:>6} {result["throughput"]:>9.1f} '
+                f'{result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f}')
+        if name in baseline and baseline[name]['p50_ms']:
+            line += f' {(result["p50_ms"] / baseline[name]["p50_ms"] - 1) * 100:>+10.1f}%'
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Wall time of the report totals computed in-process against the partitioned process pool.
+
+Seed the database first, then run from the repository root with the same environment::
+
+    flask --app run.py seed --transfers 1000000 --days 1095 --seed 1
+    python -m benchmarks.report_benchmark --days 30 365 1095 --workers 1 2 4 8
+
+``--raw`` aggregates the transfer rows directly instead of reading the rollups, which is
+where the partitioned path has the most work to split.
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.parallel_reports import ParallelReports
+from app.rollups import report_totals
+
+
+def timed(function, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365, 1095], help='report range lengths')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--partitions', type=int, default=0, help='partitions per report (default 2 per worker)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--raw', action='store_true', help='aggregate transfer rows instead of the rollups')
+    args = parser.parse_args()
+
+    app, _ = create_app([])
+    with app.app_context():
+        uri = db.engine.url.render_as_string(hide_password=False)
+        end = datetime.utcnow()
+        print(f'{"days":>6} {"path":>10} {"seconds":>9} {"speedup":>8} {"groups":>8}')
+        for days in args.days:
+            start = end - timedelta(days=days)
+            single_seconds, expected = timed(lambda: report_totals(start, end, use_rollups=not args.raw),
+                                             args.repeat)
+            print(f'{days:>6} {"single":>10} {single_seconds:>9.3f} {1:>8.2f} {len(expected):>8}')
+
+            for workers in args.workers:
+                pool = ParallelReports()
+                pool.configure(uri, workers, args.partitions)
+                pool.report_totals(start, end, use_rollups=not args.raw)  # Start the worker processes
+                seconds, totals = timed(lambda: pool.report_totals(start, end, use_rollups=not args.raw),
+                                        args.repeat)
+                pool.shutdown()
+                note = '' if totals == expected else '  MISMATCH'
+                print(f'{days:>6} {f"{workers} procs":>10} {seconds:>9.3f} {single_seconds / seconds:>8.2f} '
+                      f'{len(totals):>8}{note}')
+
+
+if __name__ == '__main__':
+    main()
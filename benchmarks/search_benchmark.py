@@ -0,0 +1,83 @@
+"""Latency of the item autocomplete index against the old ``ILIKE '%term%'`` scan.
+
+Run from the repository root::
+
+    python -m benchmarks.search_benchmark --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+from app.search import ItemSearchIndex
+from app.seed import item_name
+
+
+def make_names(count, rng):
+    return [item_name(rng, number) for number in range(1, count + 1)]
+
+
+def make_terms(names, count, rng):
+    terms = []
+    for _ in range(count):
+        name = rng.choice(names).lower()
+        if rng.random() < 0.5:
+            terms.append(name[:rng.randint(1, 8)])  # typing the start of a name
+        else:
+            start = rng.randrange(len(name) - 3)
+            terms.append(name[start:start + rng.randint(3, 6)])  # typing a word from the middle
+    return terms
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def time_queries(search, terms):
+    samples = []
+    for term in terms:
+        started = time.perf_counter()
+        search(term)
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--skip-scan', action='store_true', help='do not time the ILIKE scan baseline')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f'{"items":>9} {"build s":>8} {"index p50":>10} {"index p99":>10} {"scan p50":>10} {"scan p99":>10}')
+    for size in args.sizes:
+        names = make_names(size, rng)
+        terms = make_terms(names, args.queries, rng)
+
+        index = ItemSearchIndex()
+        started = time.perf_counter()
+        index.load(enumerate(names, start=1), 0)
+        build_seconds = time.perf_counter() - started
+        index_p50, index_p99 = time_queries(lambda term: index.search(term, args.limit), terms)
+
+        scan_p50 = scan_p99 = float('nan')
+        if not args.skip_scan:
+            connection = sqlite3.connect(':memory:')
+            connection.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, name VARCHAR(100) UNIQUE NOT NULL)')
+            connection.executemany('INSERT INTO item (id, name) VALUES (?, ?)', enumerate(names, start=1))
+            scan_p50, scan_p99 = time_queries(
+                lambda term: connection.execute('SELECT id, name FROM item WHERE name LIKE ?',
+                                                (f'%{term}%',)).fetchall(), terms)
+            connection.close()
+
+        print(f'{size:>9} {build_seconds:>8.2f} {index_p50:>9.3f}ms {index_p99:>9.3f}ms '
+              f'{scan_p50:>9.3f}ms {scan_p99:>9.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
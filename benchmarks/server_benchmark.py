@@ -0,0 +1,127 @@
+"""Throughput of the Werkzeug development server against the gunicorn-based serve command.
+
+Seed the database first, then run from the repository root with the same environment::
+
+    flask --app run.py seed --transfers 100000 --seed 1
+    python -m benchmarks.server_benchmark --email user1@example.com --password password
+
+Each server is started on its own port, driven over real HTTP by ``--concurrency`` logged-in
+clients for ``--duration`` seconds per path, then stopped.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from app.server import PROJECT_ROOT
+
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+DEV_SERVER = 'from run import app, socketio; socketio.run(app, port={port}, allow_unsafe_werkzeug=True)'
+
+
+def server_command(mode, port):
+    if mode == 'dev':
+        return [sys.executable, '-c', DEV_SERVER.format(port=port)]
+    return [sys.executable, 'run.py', 'serve', '--host', '127.0.0.1', '--port', str(port), '--mode', mode]
+
+
+def wait_until_up(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with status {process.returncode}')
+        try:
+            urllib.request.urlopen(base_url + '/auth/login', timeout=1).close()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise SystemExit(f'Server at {base_url} did not start within {timeout}s')
+
+
+def logged_in_opener(base_url, email, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = opener.open(base_url + '/auth/login').read().decode()
+    token = CSRF_PATTERN.search(page).group(1)
+    form = urllib.parse.urlencode({'email': email, 'password': password, 'csrf_token': token}).encode()
+    response = opener.open(base_url + '/auth/login', data=form)
+    if response.geturl().endswith('/auth/login'):
+        raise SystemExit(f'Could not log in as {email}; is the user seeded and active?')
+    return opener
+
+
+def drive(openers, url, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(opener):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                opener.open(url).read()
+                failed = False
+            except (urllib.error.URLError, ConnectionError, OSError):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(opener,)) for opener in openers]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'throughput': len(latencies) / seconds,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--modes', nargs='+', default=['dev', 'threading', 'gevent'],
+                        choices=['dev', 'threading', 'gevent', 'eventlet'])
+    parser.add_argument('--paths', nargs='+', default=['/items/search?term=co', '/transfers', '/items'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per path and concurrency')
+    parser.add_argument('--port', type=int, default=5080)
+    args = parser.parse_args()
+
+    print(f'{"server":<10} {"path":<24} {"clients":>7} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"errors":>6}')
+    for index, mode in enumerate(args.modes):
+        port = args.port + index
+        base_url = f'http://127.0.0.1:{port}'
+        process = subprocess.Popen(server_command(mode, port), cwd=PROJECT_ROOT, env=os.environ.copy(),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(base_url, process)
+            for clients in args.concurrency:
+                openers = [logged_in_opener(base_url, args.email, args.password) for _ in range(clients)]
+                for path in args.paths:
+                    result = drive(openers, base_url + path, args.duration)
+                    print(f'{mode:<10} {path:<24} {clients:>7} {result["throughput"]:>9.1f} '
+                          f'{result["p50_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["errors"]:>6}')
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
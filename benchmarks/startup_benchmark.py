@@ -0,0 +1,61 @@
+"""Cold start time of a worker process: imports, create_app and the first request.
+
+Run from the repository root with the usual environment against an initialised database::
+
+    flask --app run.py init-db
+    python -m benchmarks.startup_benchmark --repeat 10 --max-seconds 1.5
+
+Every sample is a fresh interpreter, once with INIT_DB_ON_STARTUP on and once with it off
+as production workers run. With --max-seconds the script exits with an error when the
+median cold start of workers exceeds it, so CI can guard against startup regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from app.server import PROJECT_ROOT
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app, socketio = create_app([])
+created = time.perf_counter()
+app.test_client().get('/auth/login')
+print(json.dumps({'imports': imported - started, 'create_app': created - imported,
+                  'first_request': time.perf_counter() - created, 'total': time.perf_counter() - started}))
+'''
+PHASES = ('imports', 'create_app', 'first_request', 'total')
+
+
+def sample(init_db):
+    env = dict(os.environ, INIT_DB_ON_STARTUP='1' if init_db else '0')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=PROJECT_ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, help='fail when the median worker start exceeds this')
+    args = parser.parse_args()
+
+    print(f'{"startup":<16} ' + ' '.join(f'{phase + " ms":>18}' for phase in PHASES))
+    medians = {}
+    for label, init_db in (('with init-db', True), ('worker', False)):
+        samples = [sample(init_db) for _ in range(args.repeat)]
+        medians[label] = {phase: statistics.median(s[phase] for s in samples) for phase in PHASES}
+        print(f'{label:<16} ' + ' '.join(f'{medians[label][phase] * 1000:>18.1f}' for phase in PHASES))
+
+    if args.max_seconds is not None and medians['worker']['total'] > args.max_seconds:
+        raise SystemExit(f'Worker cold start took {medians["worker"]["total"]:.3f}s, '
+                         f'over the {args.max_seconds:.3f}s budget.')
+
+
+if __name__ == '__main__':
+    main()
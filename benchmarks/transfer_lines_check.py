@@ -0,0 +1,131 @@
+"""Stored lines and query counts of adding and editing a large transfer through the forms.
+
+Run from the repository root; the check builds its own throwaway SQLite database::
+
+    python -m benchmarks.transfer_lines_check --lines 1000 --max-queries 25
+
+The edit drops, changes and adds lines of the completed transfer. The check fails when the
+stored lines or stock differ from what was posted, when an unchanged line is rewritten, or
+when a request runs more than --max-queries queries, so CI can guard the set-based line
+handling.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, insert, select
+from werkzeug.datastructures import MultiDict
+
+from app import create_app, db
+from app.models import Item, Location, LocationStock, Transfer, TransferItem, User
+
+
+def transfer_form(from_id, to_id, lines):
+    # Every line under one index, as the JavaScript of the transfer form posts them
+    data = MultiDict([('from_location_id', str(from_id)), ('to_location_id', str(to_id))])
+    for item_id, quantity in lines.items():
+        data.add('items-0-item', str(item_id))
+        data.add('items-0-quantity', str(quantity))
+    return data
+
+
+def stored_lines(transfer_id):
+    return {item_id: (line_id, quantity) for line_id, item_id, quantity in db.session.execute(
+        select(TransferItem.id, TransferItem.item_id, TransferItem.quantity)
+        .where(TransferItem.transfer_id == transfer_id))}
+
+
+def post(client, counter, url, data):
+    counter[0] = 0
+    started = time.perf_counter()
+    response = client.post(url, data=data)
+    seconds = time.perf_counter() - started
+    if response.status_code != 302:
+        raise SystemExit(f'POST {url} answered {response.status_code}')
+    return counter[0], seconds
+
+
+def run(line_count, max_queries):
+    app, _ = create_app([])
+    app.config['WTF_CSRF_ENABLED'] = False
+    failures = []
+
+    with app.app_context():
+        admin = db.session.scalar(select(User.id).where(User.is_admin == True))
+        source, destination = Location(name='Source'), Location(name='Destination')
+        db.session.add_all([source, destination])
+        db.session.execute(insert(Item), [{'name': f'Check item {number}'} for number in range(line_count * 2)])
+        db.session.commit()
+        source_id, destination_id = source.id, destination.id
+        item_ids = db.session.scalars(select(Item.id).order_by(Item.id)).all()
+
+        counter = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: counter.__setitem__(0, counter[0] + 1))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin)
+        session['_fresh'] = True
+
+    lines = {item_id: 2 for item_id in item_ids[:line_count]}
+    queries, seconds = post(client, counter, '/transfers/add', transfer_form(source_id, destination_id, lines))
+    print(f'add  {line_count} lines: {queries:>3} queries {seconds * 1000:>7.1f} ms')
+    if queries > max_queries:
+        failures.append(f'adding took {queries} queries')
+    with app.app_context():
+        transfer_id = db.session.scalar(select(Transfer.id).order_by(Transfer.id.desc()).limit(1))
+        before = stored_lines(transfer_id)
+        if {item_id: quantity for item_id, (_, quantity) in before.items()} != lines:
+            failures.append('added lines differ from the posted ones')
+    client.get(f'/transfers/complete/{transfer_id}')
+
+    # Drop every tenth line, change every third and add a tenth as many new ones
+    edited = {item_id: 5 if position % 3 == 0 else quantity
+              for position, (item_id, quantity) in enumerate(lines.items()) if position % 10 != 9}
+    edited.update((item_id, 7) for item_id in item_ids[line_count:line_count + line_count // 10])
+    queries, seconds = post(client, counter, f'/transfers/edit/{transfer_id}',
+                            transfer_form(source_id, destination_id, edited))
+    print(f'edit {line_count} lines: {queries:>3} queries {seconds * 1000:>7.1f} ms')
+    if queries > max_queries:
+        failures.append(f'editing took {queries} queries')
+
+    with app.app_context():
+        after = stored_lines(transfer_id)
+        if {item_id: quantity for item_id, (_, quantity) in after.items()} != edited:
+            failures.append('edited lines differ from the posted ones')
+        rewritten = [item_id for item_id, (line_id, quantity) in before.items()
+                     if item_id in after and edited[item_id] == quantity and after[item_id][0] != line_id]
+        if rewritten:
+            failures.append(f'{len(rewritten)} unchanged lines were rewritten')
+        stock = dict(db.session.execute(select(LocationStock.item_id, LocationStock.quantity)
+                                        .where(LocationStock.location_id == destination_id,
+                                               LocationStock.quantity != 0)).all())
+        if stock != edited:
+            failures.append('destination stock does not match the edited lines')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=1000)
+    parser.add_argument('--max-queries', type=int, default=25, help='queries allowed per add or edit request')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ.update(DATABASE_URL='sqlite:///' + os.path.join(folder, 'check.db'), JOB_FOLDER=folder,
+                          REPORT_CACHE_PATH=os.path.join(folder, 'report_cache.sqlite'), INIT_DB_ON_STARTUP='1')
+        os.environ.setdefault('FLASK_SECRET_KEY', 'transfer-lines-check')
+        os.environ.setdefault('ADMIN_EMAIL', 'admin@example.com')
+        os.environ.setdefault('ADMIN_PASS', 'transfer-lines-check')
+        failures = run(args.lines, args.max_queries)
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
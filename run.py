@@ -2,7 +2,14 @@ import sys
 from flask_socketio import SocketIO
 from app import create_app
 
-app, socketio = create_app(sys.argv)
+if __name__ == "__main__" and sys.argv[1:2] == ['serve']:
+    # Production server: hands over to gunicorn, which imports this module in its own processes
+    from app.server import main
+    sys.exit(main(sys.argv[2:]))
+
+# Report worker processes import the main script again as __mp_main__ and need no app
+if __name__ != '__mp_main__':
+    app, socketio = create_app(sys.argv)
 
 if __name__ == "__main__":
     socketio.run(app, allow_unsafe_werkzeug=True)
\ No newline at end of file